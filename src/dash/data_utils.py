@@ -18,7 +18,7 @@ def categorize_fields(data: dict) -> dict:
             categories["foreign_key"].append(key)
         elif 'date' in key.lower() or 'time' in key.lower():
             categories["date"].append(key)
-        elif any(suffix in key for suffix in ['_total_count', '_null_count', '_unique_count', 
+        elif any(suffix in key for suffix in ['_total_count', '_null_count', '_non_numeric_count', '_unique_count',
                                             '_mean', '_median', '_std', '_min', '_max', '_q25', '_q75']):
             categories["numerical"].append(key)
         elif key.endswith('_top_values'):
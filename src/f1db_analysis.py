@@ -3,17 +3,22 @@ Optimized F1 Database Statistical Analysis Script
 Performs comprehensive statistical analysis with a unified approach and structured output
 """
 
+import atexit
+import math
+import os
 import sqlite3
 import json
-import shutil
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import logging
-from typing import Dict, List, Any, Optional
+from collections import Counter
+from typing import Dict, List, Any, Optional, Iterator, Union
 import threading
+import warnings
+import weakref
 from dataclasses import dataclass, asdict
 
 # --- Configuration ---
@@ -23,11 +28,26 @@ DB_PATH = BASE_PATH / "database.db"
 ANALYSIS_PATH = BASE_PATH / "analysis/"
 MAX_WORKERS = 8
 SAMPLE_SIZE = 50000  # For large tables
+STREAM_CHUNK_SIZE = 8192  # Rows per chunk when streaming large-table samples
+TOP_VALUES_COUNT = 3  # Most frequent values reported per categorical column
+TOP_VALUES_EXCLUDED = frozenset({'date', 'recording_url'})  # Categorical columns reported without top values
+PRETTY_JSON = False  # Indent output files for reading by hand; compact output is smaller and faster
+SKIP_UNCHANGED_DB = True  # Skip the run when the database and settings match the last completed analysis
+FINGERPRINT_FILE = ".fingerprint"  # Written into the analysis directory after each completed run
 
 # --- Setup Logging ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Every live SQLiteManager, held weakly so registering one doesn't keep it alive; one exit hook closes them all
+_open_managers: "weakref.WeakSet[SQLiteManager]" = weakref.WeakSet()
+
+@atexit.register
+def _close_open_managers():
+    """Close the connections of every SQLiteManager still alive at interpreter exit."""
+    for manager in list(_open_managers):
+        manager.close_all()
+
 @dataclass
 class AnalysisResult:
     """Data class for holding analysis results."""
@@ -44,9 +64,24 @@ class SQLiteManager:
     
     def __init__(self, db_path: Path):
         self.db_path = db_path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []  # Every thread's connection, for close_all()
+        _open_managers.add(self)
+    
+    def __getstate__(self):
+        """Pickle only the path; each process opens its own connections."""
+        return {'db_path': self.db_path}
+    
+    def __setstate__(self, state):
+        """Restore the path with an empty per-thread connection cache."""
+        self.__init__(state['db_path'])
         
     def get_connection(self) -> sqlite3.Connection:
-        """Get an optimized database connection that prevents temporary file creation."""
+        """Get this thread's cached connection, opening and configuring it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+        
         conn = sqlite3.connect(
             f"file:{self.db_path}?mode=ro&immutable=1", 
             uri=True, 
@@ -58,19 +93,36 @@ class SQLiteManager:
             "PRAGMA journal_mode=OFF",
             "PRAGMA synchronous=OFF",
             "PRAGMA temp_store=MEMORY",
-            "PRAGMA cache_size=-10000",
-            "PRAGMA mmap_size=0"
+            "PRAGMA cache_size=-65536",     # 64 MiB page cache
+            "PRAGMA mmap_size=268435456"    # Map up to 256 MiB of the file instead of copying pages via read()
         ]
         
         for pragma in optimizations:
             conn.execute(pragma)
         
+        self._local.conn = conn
+        self._connections.append(conn)
         return conn
     
-    def execute_query(self, query: str, params: Optional[tuple] = None) -> pd.DataFrame:
-        """Execute a query and return results as DataFrame."""
+    def close(self):
+        """Close this thread's cached connection, if any."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+            self._connections.remove(conn)
+    
+    def close_all(self):
+        """Close the connections cached by every thread; also run for live managers at interpreter exit."""
+        while self._connections:
+            self._connections.pop().close()
+        self._local = threading.local()
+    
+    def execute_query(self, query: str, params: Optional[Union[tuple, dict]] = None, chunksize: Optional[int] = None,
+                      dtype: Optional[Dict[str, str]] = None) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+        """Execute a query and return results as DataFrame, or an iterator of chunks if chunksize is set."""
         with self.get_connection() as conn:
-            return pd.read_sql(query, conn, params=params)
+            return pd.read_sql(query, conn, params=params, chunksize=chunksize, dtype=dtype)
     
     def get_table_names(self, schema_filter: Dict[str, Any]) -> List[str]:
         """Get available table names that match the schema filter."""
@@ -78,24 +130,195 @@ class SQLiteManager:
         tables_df = self.execute_query(query)
         return [name for name in tables_df['name'].tolist() if name in schema_filter]
     
-    def get_table_count(self, table_name: str) -> int:
-        """Get total row count for a table."""
+    def get_table_sizes(self, table_names: List[str]) -> Dict[str, tuple[int, int]]:
+        """Get every table's row count and highest rowid in one UNION ALL statement.
+        
+        If the combined statement fails, each table is counted on its own so that one unreadable
+        table doesn't zero out the rest.
+        """
+        if not table_names:
+            return {}
+        query = " UNION ALL ".join(
+            f"SELECT '{table}', COUNT(*), MAX(rowid) FROM {table}" for table in table_names
+        )
         try:
-            result = self.execute_query(f"SELECT COUNT(*) as total_count FROM {table_name}")
-            return int(result.iloc[0]['total_count'])
+            with self.get_connection() as conn:
+                rows = conn.execute(query).fetchall()
+            return {table: (total_count, max_rowid or 0) for table, total_count, max_rowid in rows}
         except Exception as e:
-            logger.warning(f"Could not get row count for {table_name}: {e}")
-            return 0
+            logger.warning(f"Could not get row counts in one pass, counting tables separately: {e}")
+        
+        sizes = {}
+        for table in table_names:
+            try:
+                with self.get_connection() as conn:
+                    total_count, max_rowid = conn.execute(f"SELECT COUNT(*), MAX(rowid) FROM {table}").fetchone()
+                sizes[table] = (total_count, max_rowid or 0)
+            except Exception as e:
+                logger.warning(f"Could not get row count for {table}: {e}")
+                sizes[table] = (0, 0)
+        return sizes
+    
+    def table_aggregates(self, table_name: str, plan: List[tuple]) -> tuple[int, int, Dict[str, tuple]]:
+        """Compute the per-column aggregates for a table in a single SQL scan.
+        
+        Takes (column, label, data type) plan entries and returns (row count, all-null row count,
+        {label: aggregates}). Numeric columns yield (nulls, non-numeric count, count, mean, min, max,
+        shifted sum, shifted sum of squares): nulls are true NULLs, values stored as text are counted
+        apart and left out of the moments, and the sums are taken in floating point over (value - shift),
+        the shift being the column's first numeric value, so integer columns can't overflow and the
+        variance keeps its precision. Categorical columns yield (nulls, distinct count), their top
+        values being grouped separately by top_values(); booleans (nulls, true count); dates (nulls,
+        count, min, max); keys (nulls,).
+        """
+        select, null_checks, widths = [], [], []
+        for col, _, data_type in plan:
+            if data_type == 'numeric':
+                value = f"({_numeric_value(col)})"
+                # Uncorrelated, so SQLite evaluates it once; NULL (all values missing) leaves both sums NULL
+                shift = f"(SELECT {value} FROM {table_name} WHERE {value} IS NOT NULL LIMIT 1)"
+                deviation = f"(1.0 * {value} - {shift})"
+                expressions = [f"SUM({col} IS NULL)", f"SUM({col} IS NOT NULL AND {value} IS NULL)",
+                               f"COUNT({value})", f"AVG({value})", f"MIN({value})", f"MAX({value})",
+                               f"SUM({deviation})", f"SUM({deviation} * {deviation})"]
+                null_checks.append(f"{col} IS NULL")
+            else:
+                expressions = [f"SUM({col} IS NULL)"]
+                if data_type == 'categorical':
+                    expressions.append(f"COUNT(DISTINCT {col})")
+                elif data_type == 'boolean':
+                    expressions.append(f"SUM(CASE WHEN {col} THEN 1 ELSE 0 END)")
+                elif data_type == 'date':
+                    expressions.extend([f"COUNT({col})", f"MIN({col})", f"MAX({col})"])
+                null_checks.append(f"{col} IS NULL")
+            select.extend(expressions)
+            widths.append(len(expressions))
+        
+        null_rows = f"SUM({' AND '.join(dict.fromkeys(null_checks))})" if null_checks else "0"
+        query = f"SELECT COUNT(*), {', '.join([null_rows, *select])} FROM {table_name}"
+        with self.get_connection() as conn:
+            row = conn.execute(query).fetchone()
+        
+        aggregates, position = {}, 2
+        for (_, label, _), width in zip(plan, widths):
+            aggregates[label] = row[position:position + width]
+            position += width
+        return row[0], row[1] or 0, aggregates
+    
+    def raw_null_counts(self, table_name: str, columns: List[str], numeric: List[str]) -> tuple[int, Dict[str, int]]:
+        """Count the rows whose columns are all NULL and, per numeric column, the values not stored as numbers.
+        
+        The typed projection reads such values (text like '+1 LAP') as NaN; these counts keep them apart
+        from true NULLs.
+        """
+        null_rows = ' AND '.join(f"{col} IS NULL" for col in columns)
+        select = [f"SUM({null_rows})" if columns else "0"]
+        select.extend(f"SUM({col} IS NOT NULL AND ({_numeric_value(col)}) IS NULL)" for col in numeric)
+        with self.get_connection() as conn:
+            row = conn.execute(f"SELECT {', '.join(select)} FROM {table_name}").fetchone()
+        return row[0] or 0, {col: row[i] or 0 for i, col in enumerate(numeric, start=1)}
+    
+    def top_values(self, table_name: str, column: str, limit: int) -> List[tuple]:
+        """Get the most frequent non-null values of a column, grouped and ranked inside SQLite.
+        
+        This is a GROUP BY scan of its own per categorical column, outside the table_aggregates pass.
+        """
+        query = (f"SELECT {column}, COUNT(*) AS value_count FROM {table_name} WHERE {column} IS NOT NULL "
+                 f"GROUP BY {column} ORDER BY value_count DESC LIMIT {limit}")
+        with self.get_connection() as conn:
+            return conn.execute(query).fetchall()
     
     def get_table_columns(self, table_name: str) -> List[str]:
         """Get column names for a table."""
-        columns_info = self.execute_query(f"PRAGMA table_info({table_name})")
-        return columns_info['name'].tolist()
+        with self.get_connection() as conn:
+            return [row[0] for row in conn.execute("SELECT name FROM pragma_table_info(?) ORDER BY cid", (table_name,))]
     
-    def sample_table(self, table_name: str, sample_size: int) -> pd.DataFrame:
-        """Get a sample from a table using simple random sampling."""
-        query = f"SELECT * FROM {table_name} ORDER BY RANDOM() LIMIT {sample_size}"
-        return self.execute_query(query)
+    def sample_table(self, table_name: str, sample_size: int, total_rows: int, max_rowid: int,
+                     columns: str = "*",
+                     chunksize: Optional[int] = None,
+                     dtype: Optional[Dict[str, str]] = None) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+        """Get a sample from a table by looking up random rowids (no random sort, no full scan).
+        
+        Random rowids in 1..max(rowid) are generated inside SQLite by a recursive CTE and fetched in
+        rowid order via the primary key. The target is scaled by the rowid density so gaps left by
+        deleted rows still yield about `sample_size` rows, and the draw count is raised so that,
+        after duplicates collapse in the IN list, the expected number of distinct rowids hits it.
+        """
+        target = min(max_rowid, round(sample_size * max_rowid / total_rows)) if total_rows else 0
+        if target >= max_rowid:
+            return self.execute_query(f"SELECT {columns} FROM {table_name}", chunksize=chunksize, dtype=dtype)
+        draws = math.ceil(-max_rowid * math.log1p(-target / max_rowid))
+        query = (f"WITH RECURSIVE ids(n, x) AS ("
+                 f"SELECT 1, abs(random() % :max_rowid) + 1 "
+                 f"UNION ALL SELECT n + 1, abs(random() % :max_rowid) + 1 FROM ids WHERE n < :draws) "
+                 f"SELECT {columns} FROM {table_name} WHERE rowid IN (SELECT x FROM ids)")
+        return self.execute_query(query, params={'max_rowid': max_rowid, 'draws': draws},
+                                  chunksize=chunksize, dtype=dtype)
+
+def _numeric_value(column: str) -> str:
+    """SQL expression yielding a column's value only when it is stored as a number."""
+    return f"CASE WHEN typeof({column}) IN ('integer', 'real') THEN {column} END"
+
+def _stat_float(value: Any, digits: Optional[int] = None) -> Optional[float]:
+    """Convert a statistic to a native float for JSON output, mapping NaN to None."""
+    value = float(value)
+    if math.isnan(value):
+        return None
+    return round(value, digits) if digits is not None else value
+
+def _sample_std(count: int, shifted_sum: float, shifted_sum_sq: float) -> float:
+    """Sample standard deviation (ddof=1, as pandas) from a count and the sums of (value - shift) and its square.
+    
+    The shift is a value from the data itself, so the two terms are of the order of the spread rather than
+    of the mean and the subtraction doesn't cancel away the result; only rounding can take it below zero.
+    """
+    if count < 2:
+        return float('nan')
+    return math.sqrt(max(shifted_sum_sq - shifted_sum * shifted_sum / count, 0.0) / (count - 1))
+
+def _numeric_summary(df: pd.DataFrame) -> pd.DataFrame:
+    """describe()-shaped summary of float64 columns from one NumPy matrix.
+    
+    A single np.nanpercentile call sorts each column once for min/q25/median/q75/max, replacing
+    describe()'s per-statistic pandas dispatch. All-NaN columns yield NaN rows without warnings.
+    """
+    values = df.to_numpy(dtype=np.float64)
+    counts = np.count_nonzero(~np.isnan(values), axis=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        q_min, q25, median, q75, q_max = np.nanpercentile(values, [0, 25, 50, 75, 100], axis=0)
+        mean = np.nanmean(values, axis=0)
+        std = np.nanstd(values, axis=0, ddof=1)
+    return pd.DataFrame(
+        [counts, mean, std, q_min, q25, median, q75, q_max],
+        index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'],
+        columns=df.columns
+    )
+
+def _json_default(obj: Any) -> Any:
+    """json.dump fallback; statistics are built from native Python types, so this only covers stragglers."""
+    return None if pd.isna(obj) else str(obj)
+
+def _iso_duration(duration: pd.Timedelta) -> str:
+    """Format a timedelta as an ISO 8601 duration."""
+    days = duration.days
+    seconds = duration.seconds
+    hours = seconds // 3600
+    minutes = (seconds % 3600) // 60
+    seconds = seconds % 60
+    return f"P{days}DT{hours}H{minutes}M{seconds}S"
+
+def _build_column_plan(schema: Dict[str, List[str]]) -> tuple:
+    """Flatten a table schema into (column, stats label, data type) entries in analysis order."""
+    plan = []
+    for col_type, columns in schema.items():
+        if col_type in ['numeric', 'categorical', 'boolean', 'date']:
+            plan.extend((col, col, col_type) for col in columns)
+        elif col_type == 'primary_keys':
+            plan.extend((col, f"PK_{col}", 'primary_key') for col in columns)
+        elif col_type == 'foreign_keys':
+            plan.extend((col, f"FK_{col}", 'foreign_key') for col in columns)
+    return tuple(plan)
 
 class F1DatabaseAnalyzer:
     """Optimized F1 Database Statistical Analysis Engine."""
@@ -194,42 +417,154 @@ class F1DatabaseAnalyzer:
         }
     }
     
+    # Per-table column plans, precomputed once at class load
+    COLUMN_PLANS = {table: _build_column_plan(schema) for table, schema in TABLE_SCHEMA.items()}
+    ANALYZED_COLUMNS = {table: frozenset(col for col, _, _ in plan) for table, plan in COLUMN_PLANS.items()}
+    NUMERIC_COLUMNS = {table: frozenset(schema.get('numeric', [])) for table, schema in TABLE_SCHEMA.items()}
+    
     def __init__(self, db_path: Path, analysis_path: Path):
         self.db_path = db_path
         self.analysis_path = analysis_path
-        self.lock = threading.Lock()
         self.sql_manager = SQLiteManager(db_path)
         
-        # Clean and recreate analysis directory
-        if self.analysis_path.exists():
-            shutil.rmtree(self.analysis_path)
-        self.analysis_path.mkdir(parents=True, exist_ok=True)
-        
         if not self.db_path.exists():
             raise FileNotFoundError(f"Database not found at {self.db_path}")
+    
+    def _load_table_metadata(self):
+        """Read the tables' columns, row counts and max(rowid).
         
+        Run by run_analysis only once the unchanged-database check has passed, since the sizes
+        come from a full COUNT(*) over every table.
+        """
         self.available_tables = self.sql_manager.get_table_names(self.TABLE_SCHEMA)
-        self.table_row_counts = self._get_table_row_counts()
+        self.table_columns = {table: self.sql_manager.get_table_columns(table) for table in self.available_tables}
+        # Row counts and max(rowid) are read once here and reused by the summary and the sampler
+        table_sizes = self.sql_manager.get_table_sizes(self.available_tables)
+        self.table_row_counts = {table: count for table, (count, _) in table_sizes.items()}
+        self.table_max_rowids = {table: max_rowid for table, (_, max_rowid) in table_sizes.items()}
+        self.total_records = sum(self.table_row_counts.values())
         logger.info(f"Found {len(self.available_tables)} tables in database.")
     
-    def _get_table_row_counts(self) -> Dict[str, int]:
-        """Get row counts for all tables."""
-        return {table: self.sql_manager.get_table_count(table) for table in self.available_tables}
-    
-    def _get_table_sample(self, table_name: str) -> tuple[pd.DataFrame, bool]:
-        """Get a sample from a table. Returns (dataframe, was_sampled)."""
-        total_rows = self.table_row_counts.get(table_name, 0)
+    def _typed_projection(self, table_name: str) -> tuple[str, Dict[str, str]]:
+        """Build a SELECT list of the schema's columns and a dtype map so numeric columns arrive as float64.
         
+        Columns not listed in TABLE_SCHEMA (ids, URLs not analyzed, ...) are never read. Numeric columns
+        are filtered by storage type in SQL (text such as '+1 LAP' becomes NaN and is counted separately
+        by raw_null_counts), which replaces a pd.to_numeric pass per column.
+        """
+        analyzed = self.ANALYZED_COLUMNS.get(table_name, frozenset())
+        numeric = self.NUMERIC_COLUMNS.get(table_name, frozenset())
+        select, dtype = [], {}
+        for col in self.table_columns.get(table_name, []):
+            if col not in analyzed:
+                continue
+            if col in numeric:
+                select.append(f"{_numeric_value(col)} AS {col}")
+                dtype[col] = 'float64'
+            else:
+                select.append(col)
+        return (', '.join(select) or '*'), dtype
+    
+    def _get_table_sample(self, table_name: str, total_rows: int) -> pd.DataFrame:
+        """Load a table that fits within SAMPLE_SIZE in full; larger tables are streamed instead."""
         if total_rows == 0:
-            return pd.DataFrame(), False
+            return pd.DataFrame()
+        columns, dtype = self._typed_projection(table_name)
+        return self.sql_manager.execute_query(f"SELECT {columns} FROM {table_name}", dtype=dtype)
+    
+    def _sample_quantiles(self, table_name: str, columns: List[str], total_rows: int) -> Dict[str, Optional[np.ndarray]]:
+        """Compute numeric (q25, median, q75) from every row of a SAMPLE_SIZE random rowid sample.
         
-        # Simple sampling logic - if larger than SAMPLE_SIZE, sample exactly SAMPLE_SIZE
-        if total_rows <= SAMPLE_SIZE:
-            df = self.sql_manager.execute_query(f"SELECT * FROM {table_name}")
-            return df, False
-        else:
-            df = self.sql_manager.sample_table(table_name, SAMPLE_SIZE)
-            return df, True
+        The sample is streamed in chunks and only each column's non-null float64 values are kept,
+        about SAMPLE_SIZE values per column, so quantiles use all the rows that were fetched.
+        """
+        values = {col: [] for col in columns}
+        select = ', '.join(f"{_numeric_value(col)} AS {col}" for col in columns)
+        chunks = self.sql_manager.sample_table(table_name, SAMPLE_SIZE, total_rows,
+                                               self.table_max_rowids.get(table_name, 0), select,
+                                               chunksize=STREAM_CHUNK_SIZE,
+                                               dtype={col: 'float64' for col in columns})
+        for chunk in chunks:
+            for col, parts in values.items():
+                parts.append(chunk[col].dropna().to_numpy())
+        quantiles = {}
+        for col, parts in values.items():
+            sampled = np.concatenate(parts) if parts else np.empty(0)
+            quantiles[col] = np.percentile(sampled, [25, 50, 75]) if len(sampled) else None
+        return quantiles
+    
+    def _aggregate_stats(self, table_name: str, col: str, column_name: str, data_type: str, total: int,
+                         aggregates: tuple, quantiles: Optional[np.ndarray]) -> Dict[str, Any]:
+        """Render one column's SQL aggregates in the same layout as _calculate_stats."""
+        null_count = aggregates[0] or 0
+        stats = {
+            f"{column_name}_total_count": total,
+            f"{column_name}_null_count": null_count
+        }
+        if null_count == total:
+            return stats
+        
+        if data_type == 'numeric':
+            non_numeric_count, count, mean, min_value, max_value, shifted_sum, shifted_sum_sq = aggregates[1:]
+            if non_numeric_count:
+                stats[f"{column_name}_non_numeric_count"] = non_numeric_count
+            if count:
+                q25, median, q75 = quantiles if quantiles is not None else (float('nan'),) * 3
+                stats.update({
+                    f"{column_name}_mean": _stat_float(mean, 4),
+                    f"{column_name}_median": _stat_float(median, 4),
+                    f"{column_name}_std": _stat_float(_sample_std(count, shifted_sum, shifted_sum_sq), 4),
+                    f"{column_name}_min": _stat_float(min_value),
+                    f"{column_name}_max": _stat_float(max_value),
+                    f"{column_name}_q25": _stat_float(q25, 4),
+                    f"{column_name}_q75": _stat_float(q75, 4),
+                })
+        elif data_type == 'categorical':
+            stats[f"{column_name}_unique_count"] = aggregates[1]
+            if column_name not in TOP_VALUES_EXCLUDED:
+                top_values = self.sql_manager.top_values(table_name, col, TOP_VALUES_COUNT)
+                stats[f"{column_name}_top_values"] = {str(k): int(v) for k, v in top_values}
+        elif data_type == 'boolean':
+            stats[f"{column_name}_true_count"] = int(aggregates[1] or 0)
+        elif data_type == 'date':
+            count, min_date, max_date = aggregates[1:]
+            if count >= 2:
+                duration = self._calculate_date_duration(pd.Series([min_date, max_date]))
+                if duration:
+                    stats[f"{column_name}_duration"] = duration
+        
+        return stats
+    
+    def _sql_table_stats(self, table_name: str, total_rows: int) -> Dict[str, Any]:
+        """Analyze a large table with one full-table SQL aggregation pass, plus one GROUP BY per top-values column.
+        
+        Counts, nulls, means, std, min/max, distinct counts, true counts and date ranges come from the
+        aggregation pass and categorical top values from their own queries, all exact; only the numeric
+        median/q25/q75 come from a streamed sample.
+        """
+        columns = frozenset(self.table_columns.get(table_name, []))
+        plan = [entry for entry in self.COLUMN_PLANS.get(table_name, ()) if entry[0] in columns]
+        total, null_rows, aggregates = self.sql_manager.table_aggregates(table_name, plan)
+        if not total:
+            return {"error": f"No data in {table_name}"}
+        
+        numeric_cols = [col for col, _, data_type in plan if data_type == 'numeric']
+        quantiles = self._sample_quantiles(table_name, numeric_cols, total) if numeric_cols else {}
+        
+        analysis = {
+            'table_total_records': total,
+            'table_null_records': null_rows
+        }
+        for col, label, data_type in plan:
+            analysis.update(self._aggregate_stats(table_name, col, label, data_type, total,
+                                                  aggregates[label], quantiles.get(col)))
+        
+        # Table-specific metrics, derived from the aggregated moments instead of the raw rows
+        if table_name == 'laps' and 'lap_duration' in aggregates:
+            _, _, count, mean, _, _, shifted_sum, shifted_sum_sq = aggregates['lap_duration']
+            if count and count > 1 and mean > 0:
+                analysis['lap_consistency_cv'] = _stat_float(_sample_std(count, shifted_sum, shifted_sum_sq) / mean, 4)
+        return analysis
     
     def _format_number(self, num: int) -> str:
         """Format number with space separators for thousands."""
@@ -242,51 +577,57 @@ class F1DatabaseAnalyzer:
             if len(valid_dates) < 2:
                 return None
             
-            min_date = valid_dates.min()
-            max_date = valid_dates.max()
-            duration = max_date - min_date
-            
-            # Convert to ISO 8601 duration format
-            days = duration.days
-            seconds = duration.seconds
-            hours = seconds // 3600
-            minutes = (seconds % 3600) // 60
-            seconds = seconds % 60
-            
-            return f"P{days}DT{hours}H{minutes}M{seconds}S"
+            return _iso_duration(valid_dates.max() - valid_dates.min())
         except Exception:
             return None
     
-    def _calculate_stats(self, series: pd.Series, column_name: str, data_type: str) -> Dict[str, Any]:
-        """Unified statistics calculation for a given pandas Series."""
+    def _calculate_stats(self, series: pd.Series, column_name: str, data_type: str,
+                         summary: Optional[pd.Series] = None, null_count: Optional[int] = None,
+                         non_numeric_count: int = 0) -> Dict[str, Any]:
+        """Unified statistics calculation for a given pandas Series.
+        
+        Numeric columns read from `summary`, the column's slice of the table-wide _numeric_summary(),
+        when one is provided. A precomputed `null_count` lets numeric and key columns, which never
+        need their non-null values, skip the dropna pass. `non_numeric_count` is the number of the
+        series' NaNs that were text values rather than NULLs.
+        """
         total_count = len(series)
-        null_count = series.isna().sum()
+        if null_count is not None and (summary is not None or data_type in ('primary_key', 'foreign_key')):
+            valid_series = None
+        else:
+            # One dropna pass yields both the valid values and, by difference, the null count
+            valid_series = series.dropna()
+            null_count = total_count - len(valid_series)
         stats = {
             f"{column_name}_total_count": total_count,
-            f"{column_name}_null_count": int(null_count)
+            f"{column_name}_null_count": null_count
         }
         
-        valid_series = series.dropna()
-        if valid_series.empty:
+        if non_numeric_count:
+            stats[f"{column_name}_non_numeric_count"] = non_numeric_count
+        if null_count + non_numeric_count == total_count:
             return stats
 
         if data_type == 'numeric':
-            numeric_series = pd.to_numeric(valid_series, errors='coerce').dropna()
-            if not numeric_series.empty:
-                stats.update({
-                    f"{column_name}_mean": round(float(numeric_series.mean()), 4),
-                    f"{column_name}_median": round(float(numeric_series.median()), 4),
-                    f"{column_name}_std": round(float(numeric_series.std()), 4),
-                    f"{column_name}_min": float(numeric_series.min()),
-                    f"{column_name}_max": float(numeric_series.max()),
-                    f"{column_name}_q25": round(float(numeric_series.quantile(0.25)), 4),
-                    f"{column_name}_q75": round(float(numeric_series.quantile(0.75)), 4),
-                })
+            # Numeric columns arrive as float64 from the typed projection, so no coercion pass is needed
+            if summary is None:
+                summary = valid_series.describe()
+            stats.update({
+                f"{column_name}_mean": _stat_float(summary['mean'], 4),
+                f"{column_name}_median": _stat_float(summary['50%'], 4),
+                f"{column_name}_std": _stat_float(summary['std'], 4),
+                f"{column_name}_min": _stat_float(summary['min']),
+                f"{column_name}_max": _stat_float(summary['max']),
+                f"{column_name}_q25": _stat_float(summary['25%'], 4),
+                f"{column_name}_q75": _stat_float(summary['75%'], 4),
+            })
         elif data_type == 'categorical':
-            stats[f"{column_name}_unique_count"] = valid_series.nunique()
-            if column_name not in ['date', 'recording_url']:
-                value_counts = valid_series.value_counts().head(3)  # Changed from 10 to 3
-                stats[f"{column_name}_top_values"] = {str(k): int(v) for k, v in value_counts.items()}
+            # Single counting pass feeds both the unique count and the heap-based top values
+            value_counts = Counter(valid_series.to_numpy())
+            stats[f"{column_name}_unique_count"] = len(value_counts)
+            if column_name not in TOP_VALUES_EXCLUDED:
+                top_values = value_counts.most_common(TOP_VALUES_COUNT)
+                stats[f"{column_name}_top_values"] = {str(k): int(v) for k, v in top_values}
         elif data_type == 'boolean':
             bool_series = valid_series.astype(bool)
             true_count = bool_series.sum()
@@ -301,14 +642,14 @@ class F1DatabaseAnalyzer:
 
         return stats
     
-    def _get_table_specific_metrics(self, table_name: str, df: pd.DataFrame) -> Dict[str, Any]:
-        """Calculate table-specific performance metrics for deeper insights."""
+    def _get_table_specific_metrics(self, table_name: str, numeric_summary: Optional[pd.DataFrame]) -> Dict[str, Any]:
+        """Calculate table-specific performance metrics, reusing the table's numeric summary."""
         metrics = {}
         try:
-            if table_name == 'laps' and 'lap_duration' in df.columns:
-                laps = pd.to_numeric(df['lap_duration'], errors='coerce').dropna()
-                if not laps.empty and laps.mean() > 0:
-                    metrics['lap_consistency_cv'] = round((laps.std() / laps.mean()), 4)
+            if table_name == 'laps' and numeric_summary is not None and 'lap_duration' in numeric_summary:
+                laps = numeric_summary['lap_duration']
+                if laps['count'] > 0 and laps['mean'] > 0:
+                    metrics['lap_consistency_cv'] = _stat_float(laps['std'] / laps['mean'], 4)
         except Exception as e:
             logger.warning(f"Could not calculate specific metrics for {table_name}: {e}")
         return metrics
@@ -317,7 +658,13 @@ class F1DatabaseAnalyzer:
         """Analyzes a single database table and returns structured results."""
         try:
             total_records = self.table_row_counts.get(table_name, 0)
-            df, was_sampled = self._get_table_sample(table_name)
+            if total_records > SAMPLE_SIZE:
+                return AnalysisResult(
+                    name=f"{table_name}_statistics", 
+                    data=self._sql_table_stats(table_name, total_records)
+                )
+            
+            df = self._get_table_sample(table_name, total_records)
             
             if df.empty:
                 return AnalysisResult(
@@ -325,38 +672,37 @@ class F1DatabaseAnalyzer:
                     data={"error": f"No data in {table_name}"}
                 )
 
-            schema = self.TABLE_SCHEMA.get(table_name, {})
             analysis = {
-                'table_total_records': len(df) if was_sampled else total_records
+                'table_total_records': total_records
             }
             
-            # Calculate table-level nulls
-            if len(df) > 0:  
-                null_rows_count = df.isnull().all(axis=1).sum()
-                analysis['table_null_records'] = int(null_rows_count)
-            else:
-                analysis['table_null_records'] = 0
+            # One NaN mask serves both the table-level null rows and every column's null count
+            null_mask = df.isna()
+            analysis['table_null_records'] = int(null_mask.all(axis=1).sum())
+            null_counts = null_mask.sum()
 
-            # Process columns based on schema
-            for col_type, columns in schema.items():
-                if col_type in ['numeric', 'categorical', 'boolean', 'date']:
-                    for col in columns:
-                        if col in df.columns:
-                            analysis.update(self._calculate_stats(df[col], col, col_type))
-                elif col_type == 'primary_keys':
-                    # Process primary keys with PK_ prefix
-                    for col in columns:
-                        if col in df.columns:
-                            pk_stats = self._calculate_stats(df[col], f"PK_{col}", 'primary_key')
-                            analysis.update(pk_stats)
-                elif col_type == 'foreign_keys':
-                    # Process foreign keys with FK_ prefix
-                    for col in columns:
-                        if col in df.columns:
-                            fk_stats = self._calculate_stats(df[col], f"FK_{col}", 'foreign_key')
-                            analysis.update(fk_stats)
+            # Process columns based on the precomputed schema plan; PK_/FK_ prefixes are baked in
+            columns = frozenset(df.columns)
+            plan = [entry for entry in self.COLUMN_PLANS.get(table_name, ()) if entry[0] in columns]
+            
+            # One NumPy summary covers every numeric column instead of seven reductions per column
+            numeric_cols = [col for col, _, data_type in plan if data_type == 'numeric']
+            numeric_summary = _numeric_summary(df[numeric_cols]) if numeric_cols else None
+            
+            # Text in numeric columns is NaN in the frame; count it in SQL so nulls stay true NULLs
+            non_numeric = {}
+            if numeric_cols:
+                analysis['table_null_records'], non_numeric = self.sql_manager.raw_null_counts(
+                    table_name, list(df.columns), numeric_cols)
             
-            analysis.update(self._get_table_specific_metrics(table_name, df))
+            for col, label, data_type in plan:
+                summary = numeric_summary[col] if data_type == 'numeric' else None
+                non_numeric_count = non_numeric.get(col, 0)
+                analysis.update(self._calculate_stats(df[col], label, data_type, summary,
+                                                      int(null_counts[col]) - non_numeric_count,
+                                                      non_numeric_count))
+            
+            analysis.update(self._get_table_specific_metrics(table_name, numeric_summary))
             
             return AnalysisResult(
                 name=f"{table_name}_statistics", 
@@ -369,61 +715,108 @@ class F1DatabaseAnalyzer:
                 data={"error": str(e)}
             )
 
-    def _convert_for_json(self, data):
-        """Recursively converts numpy types to native Python types for JSON serialization."""
-        if isinstance(data, dict):
-            return {str(k): self._convert_for_json(v) for k, v in data.items()}
-        elif isinstance(data, list):
-            return [self._convert_for_json(item) for item in data]
-        elif isinstance(data, (np.integer, np.int64)):
-            return int(data)
-        elif isinstance(data, (np.floating, np.float64)):
-            return float(data)
-        elif pd.isna(data):
-            return None
-        return data
-    
     def save_analysis(self, result: AnalysisResult):
-        """Saves an analysis result to a JSON file, ensuring thread safety."""
-        with self.lock:
+        """Atomically saves an analysis result to its own JSON file via a temp file and rename."""
+        try:
+            filepath = self.analysis_path / f"{result.name}.json"
+            result_dict = asdict(result)
+            
+            # A sibling temp file opened with plain open() gets the usual umask-based permissions
+            # (NamedTemporaryFile would create it 0600, leaving reports unreadable to other users)
+            tmp_path = filepath.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                if PRETTY_JSON:
+                    json.dump(result_dict, f, indent=2, ensure_ascii=False, default=_json_default)
+                else:
+                    json.dump(result_dict, f, separators=(',', ':'), ensure_ascii=False, default=_json_default)
+            os.replace(tmp_path, filepath)
+            logger.info(f"✅ Saved: {result.name}")
+        except Exception as e:
+            logger.error(f"❌ Error saving {result.name}: {e}")
+    
+    def _analyze_and_save(self, table_name: str) -> AnalysisResult:
+        """Worker entry point: analyze a table and write its file from the worker itself.
+        
+        Only the table-level fields the parent reports on are sent back, not the full statistics.
+        """
+        result = self.analyze_table(table_name)
+        if 'error' not in result.data:
+            self.save_analysis(result)
+        summary_keys = ('error', 'table_total_records', 'table_null_records')
+        return AnalysisResult(
+            name=result.name,
+            data={key: result.data[key] for key in summary_keys if key in result.data},
+            timestamp=result.timestamp
+        )
+    
+    def _db_fingerprint(self) -> str:
+        """Identify the database file and the settings that shape the output."""
+        stat = self.db_path.stat()
+        return (f"{stat.st_size}-{stat.st_mtime_ns}-{SAMPLE_SIZE}-{TOP_VALUES_COUNT}-{PRETTY_JSON}-"
+                f"{','.join(sorted(TOP_VALUES_EXCLUDED))}")
+    
+    def _analysis_is_current(self, fingerprint: str) -> bool:
+        """Check whether the last completed run used this fingerprint and its reports are all present."""
+        try:
+            if (self.analysis_path / FINGERPRINT_FILE).read_text(encoding='utf-8') != fingerprint:
+                return False
+            with open(self.analysis_path / "analysis_summary.json", encoding='utf-8') as f:
+                files_generated = json.load(f)['data']['files_generated']
+            return all((self.analysis_path / name).exists() for name in files_generated)
+        except (OSError, ValueError, KeyError):
+            return False
+    
+    def _prune_stale_reports(self, files_generated: List[str]):
+        """Remove table reports from earlier runs that this run did not regenerate, and leftover temp files."""
+        keep = frozenset(files_generated)
+        stale = [path for path in self.analysis_path.glob("*_statistics.json") if path.name not in keep]
+        for path in stale + list(self.analysis_path.glob("*.tmp")):
             try:
-                filepath = self.analysis_path / f"{result.name}.json"
-                result_dict = asdict(result)
-                # Ensure all data is JSON serializable
-                result_dict['data'] = self._convert_for_json(result_dict['data'])
-                
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    json.dump(result_dict, f, indent=2, ensure_ascii=False)
-                logger.info(f"✅ Saved: {result.name}")
-            except Exception as e:
-                logger.error(f"❌ Error saving {result.name}: {e}")
+                path.unlink()
+            except OSError as e:
+                logger.warning(f"Could not remove stale report {path.name}: {e}")
     
     def run_analysis(self):
         """Main function to run the entire analysis pipeline."""
+        fingerprint = self._db_fingerprint()
+        if SKIP_UNCHANGED_DB and self._analysis_is_current(fingerprint):
+            print(f"♻️  {self.db_path.name} is unchanged since the last analysis; reports in {self.analysis_path} are current")
+            self.sql_manager.close_all()
+            return
+        
+        self._load_table_metadata()
+        
+        # Reports are replaced file by file; the fingerprint is dropped until this run completes
+        self.analysis_path.mkdir(parents=True, exist_ok=True)
+        (self.analysis_path / FINGERPRINT_FILE).unlink(missing_ok=True)
+        
         print(f"🚀 Starting F1 Database Analysis on {self.db_path.name}")
         print(f"📊 Analyzing {len(self.available_tables)} tables into {self.analysis_path}")
-        print(f"📈 Total records across all tables: {self._format_number(sum(self.table_row_counts.values()))}")
+        print(f"📈 Total records across all tables: {self._format_number(self.total_records)}")
         print("-" * 80)
         
-        # Concurrently analyze all tables
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            future_to_table = {executor.submit(self.analyze_table, table): table for table in self.available_tables}
-            table_results = {}
+        # Analyze tables in separate processes so pandas/numpy work is not serialized by the GIL.
+        # The analyzer is shipped once per worker by the initializer, and tasks carry only a table
+        # name; the largest tables are submitted first so they do not trail at the end of the run.
+        tables_by_size = sorted(self.available_tables, key=lambda t: self.table_row_counts.get(t, 0), reverse=True)
+        with ProcessPoolExecutor(max_workers=min(MAX_WORKERS, os.cpu_count() or 1),
+                                 initializer=_init_worker, initargs=(self,)) as executor:
+            future_to_table = {executor.submit(_worker_analyze_and_save, table): table for table in tables_by_size}
+            completed_tables = {}  # table -> table_null_records, in completion order
             
             for i, future in enumerate(as_completed(future_to_table), 1):
                 table = future_to_table[future]
                 try:
                     result = future.result()
                     if result and 'error' not in result.data:
-                        self.save_analysis(result)
-                        table_results[table] = result.data
+                        completed_tables[table] = result.data.get('table_null_records', 0)
                         
                         table_total_records = self.table_row_counts.get(table, 0)
-                        analyzed_records = result.data.get('table_total_records', 0)
-                        was_sampled = analyzed_records < table_total_records
+                        # Large tables are aggregated exactly in SQL; only their quantiles are sampled
+                        was_sampled = table_total_records > SAMPLE_SIZE
                         
                         if was_sampled:
-                            sample_info = f"(sampled: {self._format_number(analyzed_records)} / total: {self._format_number(table_total_records)})"
+                            sample_info = f"(sampled: {self._format_number(SAMPLE_SIZE)} / total: {self._format_number(table_total_records)})"
                         else:
                             sample_info = f"(total: {self._format_number(table_total_records)})"
                         
@@ -443,16 +836,15 @@ class F1DatabaseAnalyzer:
                 table_count = self.table_row_counts.get(table, 0)
                 tables_overview[f"{table}_total_records"] = table_count
                 
-                res = table_results.get(table, {})
-                tables_overview[f"{table}_null_records"] = res.get('table_null_records', 0)
+                tables_overview[f"{table}_null_records"] = completed_tables.get(table, 0)
 
             # Build general section
             general = {
                 'database_path': str(self.db_path),
-                'total_records': sum(self.table_row_counts.values()),
+                'total_records': self.total_records,
                 'sample_size': SAMPLE_SIZE,
                 'tables_available': len(self.available_tables),
-                'tables_completed': len(table_results)
+                'tables_completed': len(completed_tables)
             }
             
             # Swapped order: tables_overview first, then files_generated
@@ -461,20 +853,42 @@ class F1DatabaseAnalyzer:
                 data={
                     'general': general,
                     'tables_overview': tables_overview,
-                    'files_generated': [f"{t}_statistics.json" for t in table_results]
+                    'files_generated': [f"{t}_statistics.json" for t in completed_tables]
                 }
             )
             self.save_analysis(summary)
+            self._prune_stale_reports(summary.data['files_generated'])
+            # Only a run where every non-empty table completed counts as current; otherwise the next run
+            # retries the failed tables instead of skipping an unchanged database
+            failed_tables = [table for table in self.available_tables
+                             if self.table_row_counts.get(table, 0) and table not in completed_tables]
+            if failed_tables:
+                logger.warning(f"Not marking the analysis current; failed tables will be retried next run: {failed_tables}")
+            else:
+                (self.analysis_path / FINGERPRINT_FILE).write_text(fingerprint, encoding='utf-8')
         except Exception as e:
             logger.error(f"Could not generate final summary: {e}")
         
+        self.sql_manager.close_all()
+        
         print("\n" + "=" * 80)
         print("🎯 ANALYSIS COMPLETE!")
         print(f"📁 Reports generated in: {self.analysis_path}")
-        print(f"📊 Successfully analyzed {len(table_results)}/{len(self.available_tables)} tables")
-        print(f"📈 Total records processed: {self._format_number(sum(self.table_row_counts.values()))}")
+        print(f"📊 Successfully analyzed {len(completed_tables)}/{len(self.available_tables)} tables")
+        print(f"📈 Total records processed: {self._format_number(self.total_records)}")
         print("=" * 80)
 
+_worker_analyzer: Optional[F1DatabaseAnalyzer] = None
+
+def _init_worker(analyzer: F1DatabaseAnalyzer):
+    """Process pool initializer: keep the analyzer for every task this worker runs."""
+    global _worker_analyzer
+    _worker_analyzer = analyzer
+
+def _worker_analyze_and_save(table_name: str) -> AnalysisResult:
+    """Process pool task: analyze and save one table with the worker's analyzer."""
+    return _worker_analyzer._analyze_and_save(table_name)
+
 def main():
     """Main execution function."""
     try:
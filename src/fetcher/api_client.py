@@ -2,48 +2,201 @@ import requests
 import json
 import time
 import logging
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Tuple
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Tuple, Iterator
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException, Timeout
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import urllib.parse # Added for URL construction
 
+try:
+    # orjson decodes large car_data/location payloads several times faster than the stdlib
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 # Assuming BASE_URL, USER_AGENT, REQUEST_TIMEOUT, RATE_LIMIT_DELAY are defined elsewhere
 # from .config import BASE_URL, USER_AGENT, REQUEST_TIMEOUT, RATE_LIMIT_DELAY
+from .config import CACHEABLE_ENDPOINTS, CACHE_MAX_AGE
 
 logger = logging.getLogger(__name__)
 
+class ResponseTooLarge(RequestException):
+    """Raised when a response body exceeds the client's size bound."""
+
+def _read_body(response: requests.Response, max_bytes: int) -> bytes:
+    """Read a streamed response body in 64 KiB chunks, rejecting it as soon as it passes max_bytes.
+    
+    The response is always closed, returning its connection to the pool.
+    """
+    try:
+        buf = bytearray()
+        for chunk in response.iter_content(chunk_size=65536):
+            buf.extend(chunk)
+            if len(buf) > max_bytes:
+                raise ResponseTooLarge(f"Response body exceeded {max_bytes} bytes", response=response)
+        return bytes(buf)
+    finally:
+        response.close()
+
+def _decode_json(body: bytes) -> Any:
+    """Decode a JSON body, with orjson when available.
+    
+    orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers handle both alike.
+    """
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+# Endpoints whose hourly split can skip hours without recorded session activity
+ACTIVITY_SPLIT_ENDPOINTS = frozenset({'car_data', 'location', 'position', 'intervals'})
+
+# Date filter format for split requests (UTC, whole seconds)
+API_DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# Shortest window an oversized split response is halved down to
+MIN_SPLIT_WINDOW = timedelta(minutes=1)
+
+def _to_utc(dt: datetime) -> datetime:
+    """Convert an aware datetime to UTC; naive datetimes are taken to already be UTC."""
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+def _utc_hour(iso_date: str, exclusive: bool = False) -> str:
+    """UTC clock hour ('YYYY-MM-DDTHH') of an ISO timestamp; with exclusive, of the instant just before it."""
+    dt = datetime.fromisoformat(iso_date.replace('Z', '+00:00'))
+    if exclusive:
+        dt -= timedelta(microseconds=1)
+    return _to_utc(dt).strftime('%Y-%m-%dT%H')
+
+class TokenBucket:
+    """Thread-safe token bucket: sustains `refill_rate` requests per second with bursts up to `capacity`."""
+    
+    def __init__(self, capacity: float, refill_rate: float):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.refill_rate)
+        self.last_refill = now
+    
+    def acquire(self, n: float = 1):
+        """Take n tokens, sleeping just long enough for the bucket to refill if it is short."""
+        with self.lock:
+            self._refill()
+            # Reserve the tokens now (possibly going negative) so concurrent callers queue up behind us
+            self.tokens -= n
+            wait = -self.tokens / self.refill_rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+    
+    def penalize(self):
+        """Drain the bucket after a 429 so the next acquire waits for a fresh token."""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens - 1, -1)
+
 class OpenF1APIClient:
-    def __init__(self, db_manager, base_url="https://api.openf1.org/v1", user_agent="OpenF1APIClient/1.0", request_timeout=10, rate_limit_delay=0.2): # Added defaults for standalone running
+    def __init__(self, db_manager, base_url="https://api.openf1.org/v1", user_agent="OpenF1APIClient/1.0", request_timeout=10, rate_limit_delay=0.2, rate_limit_burst=5, split_workers=8, chunk_workers=5, max_concurrent_requests=8, max_response_bytes=512 * 1024 * 1024): # Added defaults for standalone running
         self.base_url = base_url
         self.db_manager = db_manager
         self.session = requests.Session()
         self.session.headers.update({'User-Agent': user_agent})
+        if brotli is not None:
+            # Telemetry JSON compresses much better with brotli; urllib3 only decodes it when the module is installed
+            self.session.headers['Accept-Encoding'] = 'br, gzip, deflate'
+        self._encoding_logged = False  # The negotiated Content-Encoding is logged once, with the first full response
         self.request_timeout = request_timeout
         self.rate_limit_delay = rate_limit_delay
+        # Bodies are streamed in chunks and rejected past this size; an oversized response falls back to date splitting
+        self.max_response_bytes = max_response_bytes
+        # One request per rate_limit_delay on average, with idle time banked up to rate_limit_burst requests
+        self.bucket = TokenBucket(capacity=rate_limit_burst, refill_rate=1 / rate_limit_delay)
+        # Meeting, endpoint, per-driver and hourly split workers all issue requests; however many of them are
+        # running, at most max_concurrent_requests are in flight at once, and the keep-alive pool holds exactly
+        # that many connections so every request reuses one instead of opening (and discarding) a TLS connection
+        self.split_workers = split_workers
+        self.chunk_workers = chunk_workers
+        self._request_slots = threading.BoundedSemaphore(max_concurrent_requests)
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=max_concurrent_requests, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # One long-lived pool per level, shared by every caller for the whole run, so worker threads (and the
+        # database connection each opens on first use) are bounded by the pool sizes instead of created per
+        # session and endpoint. Per-driver tasks wait on hourly tasks, never the reverse, so the pools can't deadlock
+        self._chunk_executor = ThreadPoolExecutor(max_workers=chunk_workers, thread_name_prefix='chunk')
+        self._split_executor = ThreadPoolExecutor(max_workers=split_workers, thread_name_prefix='split')
+    
+    def close(self):
+        """Shut down the worker pools, then close the pooled session and its keep-alive connections."""
+        self._chunk_executor.shutdown(wait=True, cancel_futures=True)
+        self._split_executor.shutdown(wait=True, cancel_futures=True)
+        self.session.close()
+    
+    def _get(self, url: str, params: Dict[str, Any] = None, headers: Dict[str, str] = None) -> Tuple[requests.Response, bytes]:
+        """Issue one GET within the concurrency bound and the rate limit, returning the response and its body."""
+        with self._request_slots:
+            self.bucket.acquire()
+            response = self.session.get(url, params=params, headers=headers, timeout=self.request_timeout, stream=True)
+            return response, _read_body(response, self.max_response_bytes)
     
     def make_request_with_retry(self, endpoint: str, params: Dict[str, Any] = None) -> List[Dict]:
         """Make API request with single retry after 1 second."""
         url = f"{self.base_url}/{endpoint}"
         
+        # Static endpoints are requested conditionally against the copy cached in the database
+        request_key, headers, cached_body = None, None, None
+        if endpoint in CACHEABLE_ENDPOINTS:
+            request_key = f"{endpoint}?{urllib.parse.urlencode(sorted((params or {}).items()), doseq=True)}"
+            etag, last_modified, cached_body, stored_at = self.db_manager.get_cached_response(request_key)
+            max_age = CACHE_MAX_AGE.get(endpoint)
+            if cached_body is not None and max_age and stored_at and time.time() - stored_at < max_age:
+                data = _decode_json(cached_body)
+                logger.info("Cache fresh: reused %s cached records from %s with params %s", len(data), endpoint, params)
+                return data
+            if cached_body is not None:
+                headers = {}
+                if etag:
+                    headers['If-None-Match'] = etag
+                if last_modified:
+                    headers['If-Modified-Since'] = last_modified
+        
         for attempt in range(2):  # 2 attempts total (initial + 1 retry)
             try:
                 if attempt > 0:
-                    logger.info(f"Retry attempt for {endpoint} with params {params} after 1s delay")
+                    logger.info("Retry attempt for %s with params %s after 1s delay", endpoint, params)
                     time.sleep(1)
                 
                 # For debugging, let's see what URL requests would build with these params
                 # prepared_request = requests.Request('GET', url, params=params).prepare()
                 # logger.debug(f"Attempt {attempt+1}: Requesting URL: {prepared_request.url}")
 
-                response = self.session.get(url, params=params, timeout=self.request_timeout)
+                response, body = self._get(url, params=params, headers=headers)
+                
+                if response.status_code == 304 and cached_body is not None:
+                    data = _decode_json(cached_body)
+                    logger.info("Not modified: reused %s cached records from %s with params %s", len(data), endpoint, params)
+                    return data
                 
                 if response.status_code in [503, 422, 429]:
                     if response.status_code == 503:
-                        logger.warning(f"Service unavailable (503) for {endpoint} with params {params}")
+                        logger.warning("Service unavailable (503) for %s with params %s", endpoint, params)
                     elif response.status_code == 422:
-                        logger.warning(f"Unprocessable entity (422) for {endpoint} with params {params}")
+                        logger.warning("Unprocessable entity (422) for %s with params %s", endpoint, params)
                     elif response.status_code == 429:
-                        logger.warning(f"Rate limited (429) for {endpoint} with params {params}")
+                        logger.warning("Rate limited (429) for %s with params %s", endpoint, params)
+                        self.bucket.penalize()
                     
                     if attempt == 0:
                         continue
@@ -54,16 +207,30 @@ class OpenF1APIClient:
                         return []
                 
                 response.raise_for_status()
-                data = response.json()
+                if not self._encoding_logged:
+                    self._encoding_logged = True
+                    logger.info("API responses use Content-Encoding: %s", response.headers.get('Content-Encoding', 'identity'))
+                data = _decode_json(body)
                 
-                logger.info(f"Successfully fetched {len(data)} records from {endpoint} with params {params}")
+                if request_key:
+                    etag = response.headers.get('ETag')
+                    last_modified = response.headers.get('Last-Modified')
+                    if etag or last_modified or endpoint in CACHE_MAX_AGE:
+                        self.db_manager.store_cached_response(request_key, etag, last_modified, body)
                 
-                time.sleep(self.rate_limit_delay)
+                logger.info("Successfully fetched %s records from %s with params %s", len(data), endpoint, params)
                 
                 return data
                 
+            except ResponseTooLarge as e:
+                # A retry would download the same oversized body again; split it into smaller requests right away
+                logger.warning("Response too large for %s with params %s: %s", endpoint, params, e)
+                if params and 'session_key' in params:
+                    return self._try_date_based_splitting(endpoint, params)
+                return []
+                
             except Timeout as e:
-                logger.warning(f"Timeout error on attempt {attempt + 1} for {endpoint} with params {params}: {e}")
+                logger.warning("Timeout error on attempt %s for %s with params %s: %s", attempt + 1, endpoint, params, e)
                 if attempt == 1:
                     logger.error(f"Max retries reached for timeout on {endpoint} with params {params}")
                     if params and 'session_key' in params: # Ensure params is not None
@@ -72,7 +239,7 @@ class OpenF1APIClient:
                 continue
                 
             except RequestException as e:
-                logger.warning(f"Request error on attempt {attempt + 1} for {endpoint} with params {params}: {e}")
+                logger.warning("Request error on attempt %s for %s with params %s: %s", attempt + 1, endpoint, params, e)
                 if attempt == 1:
                     logger.error(f"Max retries reached for {endpoint} with params {params}: {e}")
                     if params and 'session_key' in params: # Ensure params is not None
@@ -81,7 +248,7 @@ class OpenF1APIClient:
                 continue
                 
             except json.JSONDecodeError as e:
-                logger.warning(f"JSON decode error on attempt {attempt + 1} for {endpoint} with params {params}: {e}")
+                logger.warning("JSON decode error on attempt %s for %s with params %s: %s", attempt + 1, endpoint, params, e)
                 if attempt == 1:
                     logger.error(f"Max retries reached for JSON decode on {endpoint} with params {params}")
                     if params and 'session_key' in params: # Ensure params is not None
@@ -108,7 +275,7 @@ class OpenF1APIClient:
             logger.error(f"Could not get session dates for session {session_key}")
             return []
 
-        logger.info(f"Attempting date-based splitting for session {session_key} from {raw_date_start} to {raw_date_end}")
+        logger.info("Attempting date-based splitting for session %s from %s to %s", session_key, raw_date_start, raw_date_end)
         
         try:
             # Parse ISO 8601 dates
@@ -116,8 +283,9 @@ class OpenF1APIClient:
             date_start_str = str(raw_date_start)
             date_end_str = str(raw_date_end)
 
-            start_dt = datetime.fromisoformat(date_start_str.replace('Z', '+00:00'))
-            end_dt = datetime.fromisoformat(date_end_str.replace('Z', '+00:00'))
+            # Normalized to whole UTC seconds once, so each window boundary formats with a single strftime
+            start_dt = _to_utc(datetime.fromisoformat(date_start_str.replace('Z', '+00:00'))).replace(microsecond=0)
+            end_dt = _to_utc(datetime.fromisoformat(date_end_str.replace('Z', '+00:00')))
             
             # Extend end time by 1 hour when splitting by hours to ensure the last hour is included
             # The loop condition is current_dt < end_dt, so an event at exact end_dt might be missed
@@ -125,11 +293,20 @@ class OpenF1APIClient:
             # For date<END_HOUR, if end_dt is 08:00, final next_dt can be 08:00, making date<08:00.
             # If original end_dt is session end, extending ensures full coverage if session ends on the hour.
             extended_end_dt = end_dt + timedelta(hours=1) 
-            logger.info(f"Original session end time {end_dt.isoformat()}, extended for splitting to {extended_end_dt.isoformat()}")
+            logger.info("Original session end time %s, extended for splitting to %s", end_dt.isoformat(), extended_end_dt.isoformat())
             
-            all_data = []
+            # Filter out original 'date', 'date>=', 'date<' keys from params to avoid conflict
+            other_api_params = {
+                k: v for k, v in params.items() 
+                if k not in ["date", "date>=", "date<"]
+            }
+            base_request_url = f"{self.base_url}/{endpoint}"
+            # URL-encode other parameters once; doseq=True for list values
+            encoded_other_params = urllib.parse.urlencode(other_api_params, doseq=True) if other_api_params else ""
+            
+            # Build every hourly window up front so the requests can be issued concurrently
+            windows = []
             current_dt = start_dt
-            hour_count = 0
             
             # Iterate up to the *original* end time if strictly splitting within session.
             # If we want to include data up to the *start* of the hour *after* session_end, use extended_end_dt.
@@ -137,96 +314,173 @@ class OpenF1APIClient:
             while current_dt < extended_end_dt : # Using extended_end_dt ensures the hour containing original end_dt is processed
                 # Ensure next_dt does not exceed the extended_end_dt
                 next_dt = min(current_dt + timedelta(hours=1), extended_end_dt)
-                # If current_dt >= end_dt (original), we might be fetching beyond session.
-                # This logic is for splitting; it assumes data might exist across the fetched range.
-                # For precise splitting up to original end_dt:
-                # next_dt = min(current_dt + timedelta(hours=1), end_dt)
-                # And loop while current_dt < end_dt.
-                # However, if end_dt is 10:00:00Z and we split hour by hour, the last chunk should be date>=10:00:00Z&date<11:00:00Z
+                # If end_dt is 10:00:00Z and we split hour by hour, the last chunk should be date>=10:00:00Z&date<11:00:00Z
                 # to capture anything in the 10th hour. So using extended_end_dt for loop condition and min() is okay.
 
                 if current_dt >= next_dt: # Should not happen with timedelta(hours=1) unless start_dt >= extended_end_dt
                     break
 
-                date_gte_str = current_dt.isoformat().replace('+00:00', 'Z')
-                date_lt_str = next_dt.isoformat().replace('+00:00', 'Z')
-                
-                hour_count += 1
-
-                # Filter out original 'date', 'date>=', 'date<' keys from params to avoid conflict
-                other_api_params = {
-                    k: v for k, v in params.items() 
-                    if k not in ["date", "date>=", "date<"]
-                }
+                date_gte_str = current_dt.strftime(API_DATE_FORMAT)
+                date_lt_str = next_dt.strftime(API_DATE_FORMAT)
 
                 # Manually construct the date part of the query string.
                 # ISO date strings are generally URL-safe as values.
                 # The keys 'date>=' and 'date<' are used literally here.
                 date_query_segment = f"date>={date_gte_str}&date<{date_lt_str}"
 
-                base_request_url = f"{self.base_url}/{endpoint}"
-                final_url_with_params: str
-
-                if other_api_params:
-                    # URL-encode other parameters
-                    encoded_other_params = urllib.parse.urlencode(other_api_params, doseq=True) # doseq=True for list values
+                if encoded_other_params:
                     final_url_with_params = f"{base_request_url}?{encoded_other_params}&{date_query_segment}"
                 else:
                     final_url_with_params = f"{base_request_url}?{date_query_segment}"
                 
-                logger.info(f"Fetching hour {hour_count} ({date_gte_str} to {date_lt_str}) with URL: {final_url_with_params}")
-                
-                try:
-                    # Make request with the fully constructed URL; params should be None
-                    response = self.session.get(final_url_with_params, timeout=self.request_timeout)
-                    response.raise_for_status() # Raise HTTPError for bad responses (4XX or 5XX)
-                    hour_data = response.json()
-                    
-                    if hour_data: # Check if list is not empty
-                        all_data.extend(hour_data)
-                        logger.info(f"Hour {hour_count}: fetched {len(hour_data)} records")
-                    else:
-                        logger.info(f"Hour {hour_count}: no data found for this interval")
-                    
-                    time.sleep(self.rate_limit_delay) # Rate limiting
-                    
-                except Timeout:
-                    logger.warning(f"Timeout fetching hour {hour_count} ({date_gte_str} to {date_lt_str})")
-                except RequestException as e: # Catches HTTPError, ConnectionError, etc.
-                    logger.warning(f"Failed to fetch hour {hour_count} ({date_gte_str} to {date_lt_str}): {e}")
-                except json.JSONDecodeError as e:
-                    logger.warning(f"JSON decode error for hour {hour_count} ({date_gte_str} to {date_lt_str}): {e}. Response text: {response.text[:200] if response else 'N/A'}")
-
+                windows.append((len(windows) + 1, date_gte_str, date_lt_str, final_url_with_params))
                 current_dt = next_dt
             
-            logger.info(f"Date-based splitting completed: {len(all_data)} total records fetched across {hour_count} hourly attempts.")
+            # Telemetry-style endpoints only have data while cars are running: skip hours with no
+            # recorded laps or race control activity, or next to such an hour (a window may straddle
+            # two clock hours). Unless laps and race control are stored for the whole session,
+            # nothing is skipped and every window is fetched
+            if endpoint in ACTIVITY_SPLIT_ENDPOINTS:
+                active_hours = self.db_manager.get_active_hours(session_key)
+                if active_hours:
+                    active_windows = [
+                        window for window in windows
+                        if _utc_hour(window[1]) in active_hours
+                        or _utc_hour(window[2], exclusive=True) in active_hours
+                    ]
+                    if len(active_windows) < len(windows):
+                        active_indexes = {window[0] for window in active_windows}
+                        skipped = [f"{window[1]} to {window[2]}" for window in windows if window[0] not in active_indexes]
+                        logger.warning("Skipping %s of %s hours with no recorded activity for %s in session %s (params %s): %s",
+                                       len(skipped), len(windows), endpoint, session_key, params, skipped)
+                    windows = active_windows
+            hour_count = len(windows)
+            
+            # Hours are independent: fetch them on a bounded thread pool, all drawing from the shared
+            # token bucket, so wall time is bound by the rate limit rather than serial round trips
+            hour_results = {}
+            futures = {self._split_executor.submit(self._fetch_hour, *window): window[0] for window in windows}
+            for future in as_completed(futures):
+                hour_results[futures[future]] = future.result()
+            
+            # Reassemble in hour order
+            all_data = []
+            for hour_index in sorted(hour_results):
+                all_data.extend(hour_results[hour_index])
+            
+            empty_hours = sum(1 for hour_data in hour_results.values() if not hour_data)
+            logger.info("Date-based splitting completed: %s total records fetched across %s hourly attempts (data in %s hours, %s empty).",
+                        len(all_data), hour_count, hour_count - empty_hours, empty_hours)
             return all_data
             
         except Exception as e: # Catch any other errors during date parsing or loop setup
             logger.error(f"Error in date-based splitting setup or execution: {e}", exc_info=True)
             return []
 
-    def make_chunked_request(self, endpoint: str, base_params: Dict[str, Any], 
-                           chunk_key: str, chunk_values: List[Any]) -> List[Dict]:
-        """Make requests for each value in chunk_values individually."""
-        all_data = []
+    def _fetch_hour(self, hour_count: int, date_gte_str: str, date_lt_str: str, url: str) -> List[Dict]:
+        """Fetch one hourly window for date-based splitting, retrying once after a 429 or 503.
         
+        A window whose response is too large is halved and each half fetched in turn, down to
+        MIN_SPLIT_WINDOW.
+        """
+        body = None
+        for attempt in range(2):
+            try:
+                logger.info("Fetching hour %s (%s to %s) with URL: %s", hour_count, date_gte_str, date_lt_str, url)
+                # Make request with the fully constructed URL; params should be None
+                response, body = self._get(url)
+                
+                if response.status_code in [503, 429] and attempt == 0:
+                    logger.warning("Hour %s returned %s, retrying", hour_count, response.status_code)
+                    # Back off by draining the shared bucket; the retry waits for it to refill
+                    self.bucket.penalize()
+                    continue
+                
+                response.raise_for_status() # Raise HTTPError for bad responses (4XX or 5XX)
+                hour_data = _decode_json(body)
+                
+                if hour_data: # Check if list is not empty
+                    logger.info("Hour %s: fetched %s records", hour_count, len(hour_data))
+                    return hour_data
+                logger.debug("Hour %s: no data found for this interval", hour_count)
+                return []
+                
+            except ResponseTooLarge as e:
+                return self._fetch_halves(hour_count, date_gte_str, date_lt_str, url, e)
+            except Timeout:
+                logger.warning("Timeout fetching hour %s (%s to %s)", hour_count, date_gte_str, date_lt_str)
+            except RequestException as e: # Catches HTTPError, ConnectionError, etc.
+                logger.warning("Failed to fetch hour %s (%s to %s): %s", hour_count, date_gte_str, date_lt_str, e)
+            except json.JSONDecodeError as e:
+                logger.warning("JSON decode error for hour %s (%s to %s): %s. Response text: %s", hour_count, date_gte_str, date_lt_str, e, body[:200] if body else 'N/A')
+            return []
+        return []
+
+    def _fetch_halves(self, hour_count: int, date_gte_str: str, date_lt_str: str, url: str,
+                      error: ResponseTooLarge) -> List[Dict]:
+        """Refetch an oversized split window as two halves, serially on the calling split worker."""
+        start_dt = datetime.strptime(date_gte_str, API_DATE_FORMAT)
+        end_dt = datetime.strptime(date_lt_str, API_DATE_FORMAT)
+        if end_dt - start_dt <= MIN_SPLIT_WINDOW:
+            logger.error("Window %s to %s of hour %s is still too large to fetch: %s", date_gte_str, date_lt_str, hour_count, error)
+            return []
+        
+        mid_str = (start_dt + (end_dt - start_dt) / 2).replace(microsecond=0).strftime(API_DATE_FORMAT)
+        logger.warning("Hour %s (%s to %s) too large, splitting at %s: %s", hour_count, date_gte_str, date_lt_str, mid_str, error)
+        # The date filters always end the split URL, so the halves keep everything before them
+        url_prefix = url[:url.index('date>=')]
+        data = []
+        for gte_str, lt_str in ((date_gte_str, mid_str), (mid_str, date_lt_str)):
+            data.extend(self._fetch_hour(hour_count, gte_str, lt_str, f"{url_prefix}date>={gte_str}&date<{lt_str}"))
+        return data
+
+    def iter_chunked_request(self, endpoint: str, base_params: Dict[str, Any],
+                             chunk_key: str, chunk_values: List[Any]) -> Iterator[List[Dict]]:
+        """Make requests for each value in chunk_values individually, yielding each value's records as they arrive.
+        
+        Requests run concurrently on the client's shared chunk pool under the shared token bucket, and results
+        are yielded in chunk_values order. Callers that store records chunk by chunk hold few drivers' payloads
+        at a time instead of a whole session's.
+        """
+        futures = []
         for value in chunk_values:
             params = base_params.copy() # Start with a copy of base parameters
             params[chunk_key] = value   # Add/overwrite the chunk-specific parameter
             
-            logger.info(f"Fetching {endpoint} for {chunk_key}={value} with params {params}")
+            logger.info("Fetching %s for %s=%s with params %s", endpoint, chunk_key, value, params)
             
             # Use the main make_request_with_retry method which includes retry and date splitting logic
-            data = self.make_request_with_retry(endpoint, params) 
+            futures.append((value, self._chunk_executor.submit(self.make_request_with_retry, endpoint, params)))
+        
+        try:
+            empty_values = []
+            for value, future in futures:
+                data = future.result()
+                
+                if data: # If data is a non-empty list
+                    logger.info("Successfully fetched %s records for %s=%s", len(data), chunk_key, value)
+                    yield data
+                elif isinstance(data, list) and not data: # Empty list, means no data or max retries failed cleanly
+                    logger.debug("No data returned or fetched for %s=%s", chunk_key, value)
+                    empty_values.append(value)
+                # make_request_with_retry returns [] on failure, so no explicit 'else' for failure here is needed
+                # as it's covered by the log messages within make_request_with_retry or _try_date_based_splitting.
             
-            if data: # If data is a non-empty list
-                all_data.extend(data)
-                logger.info(f"Successfully fetched {len(data)} records for {chunk_key}={value}")
-            elif isinstance(data, list) and not data: # Empty list, means no data or max retries failed cleanly
-                logger.info(f"No data returned or fetched for {chunk_key}={value}")
-            # make_request_with_retry returns [] on failure, so no explicit 'else' for failure here is needed
-            # as it's covered by the log messages within make_request_with_retry or _try_date_based_splitting.
+            # One summary line instead of a line per empty value
+            if empty_values:
+                logger.info("No data returned for %s of %s %s values on %s: %s",
+                            len(empty_values), len(futures), chunk_key, endpoint, empty_values)
+        finally:
+            # A caller that stops early or fails mid-session doesn't leave its queued requests on the shared pool
+            for _, future in futures:
+                future.cancel()
+
+    def make_chunked_request(self, endpoint: str, base_params: Dict[str, Any], 
+                           chunk_key: str, chunk_values: List[Any]) -> List[Dict]:
+        """Make requests for each value in chunk_values individually."""
+        all_data = []
+        for data in self.iter_chunked_request(endpoint, base_params, chunk_key, chunk_values):
+            all_data.extend(data)
         
-        logger.info(f"Chunked request for {endpoint} on key '{chunk_key}' completed. Total records: {len(all_data)}")
+        logger.info("Chunked request for %s on key '%s' completed. Total records: %s", endpoint, chunk_key, len(all_data))
         return all_data
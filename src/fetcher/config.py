@@ -16,6 +16,12 @@ BASE_URL = "https://api.openf1.org/v1"
 USER_AGENT = "OpenF1-Data-Fetcher/2.0"
 REQUEST_TIMEOUT = 60
 RATE_LIMIT_DELAY = 0.2
+# Endpoints whose responses rarely change once a weekend is over; requested conditionally (ETag /
+# Last-Modified) against a copy kept in the database's http_cache table
+CACHEABLE_ENDPOINTS = frozenset({'meetings', 'sessions', 'drivers'})
+# Seconds a cached response is reused without asking the API at all; a year's meetings list only grows
+# as the season's calendar is published, so a resumed run can skip the request entirely
+CACHE_MAX_AGE = {'meetings': 24 * 60 * 60}
 
 # Ensure folders exist
 os.makedirs(DATA_FOLDER, exist_ok=True)
@@ -244,3 +250,19 @@ TABLE_SCHEMAS = {
         )
     '''
 }
+
+# Natural keys per table: a unique index is created on these columns and inserts upsert on them,
+# so re-fetched records update in place instead of piling up under new autoincrement ids.
+# race_control has none (several messages can share a timestamp); meetings and sessions use their primary keys.
+NATURAL_KEYS = {
+    'drivers': ('session_key', 'driver_number'),
+    'intervals': ('session_key', 'driver_number', 'date'),
+    'laps': ('session_key', 'driver_number', 'lap_number'),
+    'pit': ('session_key', 'driver_number', 'date'),
+    'position': ('session_key', 'driver_number', 'date'),
+    'stints': ('session_key', 'driver_number', 'stint_number'),
+    'team_radio': ('session_key', 'driver_number', 'date'),
+    'weather': ('session_key', 'date'),
+    'car_data': ('session_key', 'driver_number', 'date'),
+    'location': ('session_key', 'driver_number', 'date')
+}
@@ -6,19 +6,114 @@ import sqlite3
 import json
 import os
 import logging
-from typing import List, Dict, Any
-from .config import TABLE_SCHEMAS, DATA_FOLDER
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterable, Set, Tuple
+from .config import TABLE_SCHEMAS, NATURAL_KEYS, DATA_FOLDER
+
+try:
+    # orjson encodes list fields several times faster than the stdlib
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+def _encode_json(value: Any) -> str:
+    """Encode a list field for storage as TEXT, with orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value)
+
 class DatabaseManager:
     def __init__(self, db_filename: str):
         self.db_path = os.path.join(DATA_FOLDER, db_filename)
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []  # Every thread's connection, so close() can reach them all
+        # Meetings are fetched on several threads; writes take turns so none of them waits out SQLite's busy timeout.
+        # Re-entrant so inserts can run inside transaction()
+        self._write_lock = threading.RLock()
+        self._insert_stmts: Dict[str, Tuple[str, Tuple[str, ...]]] = {}
+        self._upsert_keys: Dict[str, Tuple[str, ...]] = {}  # Natural keys backed by a unique index
+        # Per-session lookups memoized for the run; cleared whenever their source table is written. Filled under
+        # the write lock so a lookup can't interleave with an insert, and empty results are never memoized
+        self._session_dates_cache: Dict[int, tuple] = {}
+        self._drivers_cache: Dict[int, List[int]] = {}
         self.init_database()
     
     def _get_connection(self):
-        """Get a database connection."""
-        return sqlite3.connect(self.db_path)
+        """Get this thread's long-lived connection, opening and configuring it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+        
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        
+        # WAL with NORMAL sync keeps commits cheap across the fetcher's many small batches
+        optimizations = [
+            "PRAGMA journal_mode=WAL",
+            "PRAGMA synchronous=NORMAL",
+            "PRAGMA cache_size=-65536",     # 64 MiB page cache
+            "PRAGMA temp_store=MEMORY"
+        ]
+        
+        for pragma in optimizations:
+            conn.execute(pragma)
+        
+        self._local.conn = conn
+        with self._write_lock:
+            self._connections.append(conn)
+        return conn
+    
+    def close(self):
+        """Close the connections opened by every thread; call once worker threads are done."""
+        with self._write_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local.conn = None
+    
+    @contextmanager
+    def transaction(self):
+        """Group this thread's inserts into one transaction, committed (and synced) once at the end.
+        
+        Holds the write lock throughout, so only wrap database work, never network requests.
+        A failed insert_data inside still rolls back just its own batch.
+        """
+        conn = self._get_connection()
+        with self._write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            self._local.in_transaction = True
+            try:
+                yield
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                self._local.in_transaction = False
+    
+    def _get_insert_statement(self, conn: sqlite3.Connection, table_name: str) -> Tuple[str, Tuple[str, ...]]:
+        """Get a table's INSERT statement and column order, built once per table from PRAGMA table_info.
+        
+        Every column except the autoincrement `id` is bound, so fields missing from a record insert as NULL.
+        Tables with a natural key upsert on it, keeping the row's id; others use INSERT OR REPLACE.
+        """
+        statement = self._insert_stmts.get(table_name)
+        if statement is None:
+            columns = tuple(row[1] for row in conn.execute(f"PRAGMA table_info({table_name})") if row[1] != 'id')
+            placeholders = ', '.join(['?' for _ in columns])
+            keys = self._upsert_keys.get(table_name)
+            if keys:
+                updates = ', '.join(f"{col} = excluded.{col}" for col in columns if col not in keys)
+                insert_sql = (f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders}) "
+                              f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}")
+            else:
+                insert_sql = f"INSERT OR REPLACE INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+            statement = (insert_sql, columns)
+            self._insert_stmts[table_name] = statement
+        return statement
     
     def init_database(self):
         """Initialize SQLite database with all required tables."""
@@ -34,64 +129,150 @@ class DatabaseManager:
             )
         ''')
         
+        # Resumable fetch state, read and written by ProgressManager
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS progress_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS progress_meetings (
+                meeting_key INTEGER PRIMARY KEY,
+                meeting_fetched INTEGER NOT NULL DEFAULT 0,
+                sessions_fetched INTEGER NOT NULL DEFAULT 0,
+                data_fetched INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS progress_sessions (
+                session_key INTEGER PRIMARY KEY,
+                meeting_key INTEGER,
+                data_fetched INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        
+        # Conditional-request cache for static endpoints
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS http_cache (
+                request_key TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                body BLOB,
+                stored_at REAL
+            )
+        ''')
+        # Databases created before stored_at existed
+        if 'stored_at' not in {row[1] for row in cursor.execute("PRAGMA table_info(http_cache)")}:
+            cursor.execute("ALTER TABLE http_cache ADD COLUMN stored_at REAL")
+        
         # Create all tables
         for table_name, schema in TABLE_SCHEMAS.items():
             cursor.execute(schema)
-            logger.info(f"Created/verified table: {table_name}")
+            logger.info("Created/verified table: %s", table_name)
+        
+        # Unique indexes on natural keys; added as indexes so databases created before them pick them up too
+        for table_name, keys in NATURAL_KEYS.items():
+            try:
+                cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table_name}_natural_key ON {table_name} ({', '.join(keys)})")
+                self._upsert_keys[table_name] = keys
+            except sqlite3.IntegrityError:
+                logger.warning("Existing duplicates in %s; inserting without upsert on %s", table_name, keys)
+        
+        # Lookup indexes: natural keys all lead with session_key, so only tables without one need a
+        # separate session index (a redundant one would only slow inserts into the telemetry tables)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_meeting_key ON sessions (meeting_key)")
+        for table_name in TABLE_SCHEMAS:
+            if table_name not in ('meetings', 'sessions') and table_name not in self._upsert_keys:
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_session_key ON {table_name} (session_key)")
         
         conn.commit()
-        conn.close()
         logger.info("Database initialization completed")
     
-    def insert_data(self, table_name: str, data: List[Dict]):
-        """Insert data into specified table with dynamic column handling."""
+    def query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        """Run a read-only statement on this thread's connection and return all rows."""
+        return self._get_connection().execute(sql, params).fetchall()
+    
+    def execute_write(self, sql: str, params: tuple = ()):
+        """Run a single write statement, joining the current transaction() if there is one."""
+        conn = self._get_connection()
+        if getattr(self._local, 'in_transaction', False):
+            conn.execute(sql, params)
+        else:
+            with self._write_lock, conn:
+                conn.execute(sql, params)
+    
+    def insert_data(self, table_name: str, data: Iterable[Dict]):
+        """Insert data into specified table with dynamic column handling.
+        
+        data may be any iterable of records, generators included; it is consumed once, straight into executemany.
+        """
         if not data:
             return
             
         conn = self._get_connection()
-        cursor = conn.cursor()
         
         try:
-            # Get existing table columns
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            existing_columns = {row[1] for row in cursor.fetchall()}
+            insert_sql, columns = self._get_insert_statement(conn, table_name)
             
-            # Handle JSON arrays in lap segments and other list fields
-            processed_data = []
-            for record in data:
-                processed_record = {}
-                for key, value in record.items():
-                    if isinstance(value, list):
-                        processed_record[key] = json.dumps(value)
-                    else:
-                        processed_record[key] = value
-                processed_data.append(processed_record)
-            
-            if processed_data:
-                # Only use columns that exist in the table
-                first_record = processed_data[0]
-                valid_columns = [col for col in first_record.keys() if col in existing_columns]
+            if columns:
+                # Rows are generated lazily; JSON arrays in lap segments and other list fields are encoded inline
+                inserted = 0
+                def rows():
+                    nonlocal inserted
+                    for record in data:
+                        inserted += 1
+                        yield tuple(_encode_json(value) if isinstance(value, list) else value
+                                    for value in (record.get(col) for col in columns))
                 
-                if valid_columns:
-                    placeholders = ', '.join(['?' for _ in valid_columns])
-                    insert_sql = f"INSERT OR REPLACE INTO {table_name} ({', '.join(valid_columns)}) VALUES ({placeholders})"
-                    
-                    # Prepare data for insertion
-                    rows = []
-                    for record in processed_data:
-                        row = [record.get(col) for col in valid_columns]
-                        rows.append(row)
-                    
-                    cursor.executemany(insert_sql, rows)
-                    conn.commit()
-                    logger.info(f"Inserted {len(rows)} records into {table_name}")
+                if getattr(self._local, 'in_transaction', False):
+                    # Inside transaction(): a savepoint lets a failed batch roll back alone
+                    conn.execute("SAVEPOINT insert_batch")
+                    try:
+                        conn.executemany(insert_sql, rows())
+                    except Exception:
+                        conn.execute("ROLLBACK TO insert_batch")
+                        raise
+                    finally:
+                        conn.execute("RELEASE insert_batch")
                 else:
-                    logger.warning(f"No valid columns found for {table_name}")
+                    # One transaction per batch: committed on success, rolled back on error
+                    with self._write_lock, conn:
+                        conn.executemany(insert_sql, rows())
+                if not inserted:
+                    return
+                if table_name in ('sessions', 'drivers'):
+                    with self._write_lock:
+                        if table_name == 'sessions':
+                            self._session_dates_cache.clear()
+                        else:
+                            self._drivers_cache.clear()
+                logger.info("Inserted %s records into %s", inserted, table_name)
+            else:
+                logger.warning("No valid columns found for %s", table_name)
         
         except Exception as e:
             logger.error(f"Error inserting data into {table_name}: {e}")
-        finally:
-            conn.close()
+    
+    def get_cached_response(self, request_key: str) -> Tuple[Any, Any, Any, Any]:
+        """Get the (etag, last_modified, body, stored_at) cached for a request, or Nones if there is none."""
+        conn = self._get_connection()
+        
+        try:
+            result = conn.execute("SELECT etag, last_modified, body, stored_at FROM http_cache WHERE request_key = ?",
+                                  (request_key,)).fetchone()
+            return result if result else (None, None, None, None)
+        except Exception as e:
+            logger.error(f"Error reading HTTP cache for {request_key}: {e}")
+            return (None, None, None, None)
+    
+    def store_cached_response(self, request_key: str, etag: str, last_modified: str, body: bytes):
+        """Store a response body with its validators and the time it was stored."""
+        try:
+            self.execute_write("INSERT OR REPLACE INTO http_cache (request_key, etag, last_modified, body, stored_at) VALUES (?, ?, ?, ?, ?)",
+                               (request_key, etag, last_modified, body, time.time()))
+        except Exception as e:
+            logger.error(f"Error writing HTTP cache for {request_key}: {e}")
     
     def is_data_exists(self, table_name: str, key_column: str, key_value: Any) -> bool:
         """Check if data already exists in the table for given key."""
@@ -99,14 +280,12 @@ class DatabaseManager:
         cursor = conn.cursor()
         
         try:
-            cursor.execute(f"SELECT COUNT(*) FROM {table_name} WHERE {key_column} = ?", (key_value,))
-            count = cursor.fetchone()[0]
-            return count > 0
+            # Stops at the first matching row instead of counting them all
+            cursor.execute(f"SELECT 1 FROM {table_name} WHERE {key_column} = ? LIMIT 1", (key_value,))
+            return cursor.fetchone() is not None
         except Exception as e:
             logger.error(f"Error checking if data exists in {table_name}: {e}")
             return False
-        finally:
-            conn.close()
     
     def get_existing_keys(self, table_name: str, key_column: str) -> List[Any]:
         """Get all existing keys from a table."""
@@ -119,8 +298,6 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Error getting existing keys from {table_name}: {e}")
             return []
-        finally:
-            conn.close()
     
     def get_session_dates(self, session_key: int) -> tuple:
         """Get date_start and date_end for a specific session."""
@@ -128,14 +305,18 @@ class DatabaseManager:
         cursor = conn.cursor()
         
         try:
-            cursor.execute("SELECT date_start, date_end FROM sessions WHERE session_key = ?", (session_key,))
-            result = cursor.fetchone()
-            return result if result else (None, None)
+            with self._write_lock:
+                if session_key in self._session_dates_cache:
+                    return self._session_dates_cache[session_key]
+                cursor.execute("SELECT date_start, date_end FROM sessions WHERE session_key = ?", (session_key,))
+                result = cursor.fetchone()
+                if not result:
+                    return (None, None)
+                self._session_dates_cache[session_key] = result
+                return result
         except Exception as e:
             logger.error(f"Error getting session dates for session {session_key}: {e}")
             return (None, None)
-        finally:
-            conn.close()
     
     def get_drivers_for_session(self, session_key: int) -> List[int]:
         """Get all driver numbers that participated in a specific session."""
@@ -143,13 +324,65 @@ class DatabaseManager:
         cursor = conn.cursor()
         
         try:
-            cursor.execute("SELECT DISTINCT driver_number FROM drivers WHERE session_key = ? AND driver_number IS NOT NULL", (session_key,))
-            return [row[0] for row in cursor.fetchall()]
+            with self._write_lock:
+                if session_key in self._drivers_cache:
+                    return list(self._drivers_cache[session_key])
+                cursor.execute("SELECT DISTINCT driver_number FROM drivers WHERE session_key = ? AND driver_number IS NOT NULL", (session_key,))
+                drivers = [row[0] for row in cursor.fetchall()]
+                if drivers:
+                    self._drivers_cache[session_key] = drivers
+                return list(drivers)
         except Exception as e:
             logger.error(f"Error getting drivers for session {session_key}: {e}")
             return []
-        finally:
-            conn.close()
+    
+    def get_active_hours(self, session_key: int) -> Set[str]:
+        """Get the UTC hours ('YYYY-MM-DDTHH') with recorded activity in a session, padded by an hour each side.
+        
+        Built from lap starts and ends plus race control messages, which are fetched before the
+        per-driver telemetry; the padding keeps formation and out laps just outside the timed laps.
+        An empty set means there is nothing reliable to go on: it is returned unless laps are stored
+        for every driver in the session and race control messages are stored too, so a failed or
+        partially resumed laps fetch never causes telemetry hours to be skipped.
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            driver_count, lap_driver_count, has_race_control = cursor.execute("""
+                SELECT (SELECT COUNT(DISTINCT driver_number) FROM drivers WHERE session_key = ?),
+                       (SELECT COUNT(DISTINCT driver_number) FROM laps WHERE session_key = ?),
+                       EXISTS (SELECT 1 FROM race_control WHERE session_key = ?)
+            """, (session_key, session_key, session_key)).fetchone()
+            if not driver_count or lap_driver_count < driver_count or not has_race_control:
+                return set()
+            cursor.execute("""
+                WITH activity(ts) AS (
+                    SELECT date_start FROM laps WHERE session_key = ? AND date_start IS NOT NULL
+                    UNION ALL
+                    SELECT datetime(date_start, '+' || lap_duration || ' seconds')
+                    FROM laps WHERE session_key = ? AND date_start IS NOT NULL AND lap_duration IS NOT NULL
+                    UNION ALL
+                    SELECT date FROM race_control WHERE session_key = ? AND date IS NOT NULL
+                ), offsets(shift) AS (VALUES ('-1 hours'), ('+0 hours'), ('+1 hours'))
+                SELECT DISTINCT strftime('%Y-%m-%dT%H', ts, shift) FROM activity, offsets
+            """, (session_key, session_key, session_key))
+            return {row[0] for row in cursor.fetchall() if row[0]}
+        except Exception as e:
+            logger.error(f"Error getting active hours for session {session_key}: {e}")
+            return set()
+    
+    def get_existing_dates(self, table_name: str, session_key: int, driver_number: int) -> Set[str]:
+        """Get the sample dates already stored for one driver in a session (served by the natural-key index)."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute(f"SELECT date FROM {table_name} WHERE session_key = ? AND driver_number = ?", (session_key, driver_number))
+            return {row[0] for row in cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"Error getting existing dates from {table_name} for session {session_key}: {e}")
+            return set()
     
     def get_sessions_for_meeting(self, meeting_key: int) -> List[int]:
         """Get all session keys for a specific meeting."""
@@ -162,8 +395,6 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Error getting sessions for meeting {meeting_key}: {e}")
             return []
-        finally:
-            conn.close()
     
     def print_summary(self):
         """Print summary of data in database."""
@@ -181,18 +412,16 @@ class DatabaseManager:
         logger.info("="*60)
         
         total_records = 0
-        for table in tables:
-            try:
-                cursor.execute(f"SELECT COUNT(*) FROM {table}")
-                count = cursor.fetchone()[0]
+        try:
+            # One UNION ALL statement counts every table in a single round trip
+            cursor.execute(" UNION ALL ".join(f"SELECT '{table}', COUNT(*) FROM {table}" for table in tables))
+            for table, count in cursor.fetchall():
                 total_records += count
                 logger.info(f"{table:<20}: {count:>15,} records")
-            except Exception as e:
-                logger.error(f"Error counting {table}: {e}")
+        except Exception as e:
+            logger.error(f"Error counting tables: {e}")
         
         logger.info("="*60)
         logger.info(f"{'TOTAL':<20}: {total_records:>15,} records")
-        logger.info(f"Database saved to: {self.db_path}")
+        logger.info("Database saved to: %s", self.db_path)
         logger.info("="*60)
-        
-        conn.close()
@@ -3,6 +3,7 @@ Enhanced OpenF1 API Data Fetcher class - Meeting-by-meeting processing
 """
 
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Union, Dict
 from .config import DB_FILENAME
 from .database import DatabaseManager
@@ -12,7 +13,7 @@ from .api_client import OpenF1APIClient
 logger = logging.getLogger(__name__)
 
 class OpenF1Fetcher:
-    def __init__(self, years: Union[int, List[int]] = 2024, meetings: Union[int, List[int], slice] = None, db_filename: str = DB_FILENAME):
+    def __init__(self, years: Union[int, List[int]] = 2024, meetings: Union[int, List[int], slice] = None, db_filename: str = DB_FILENAME, endpoint_workers: int = 4, meeting_workers: int = 4):
         # Process years parameter
         if isinstance(years, int):
             self.years = [years]
@@ -20,10 +21,21 @@ class OpenF1Fetcher:
             self.years = years
         
         self.meetings_filter = meetings
+        # Meeting-level endpoints are requested concurrently; the API client's token bucket still paces them
+        self.endpoint_workers = endpoint_workers
+        # Meetings are processed concurrently so one meeting's slow requests don't leave the link idle
+        self.meeting_workers = meeting_workers
+        # Shared by all meetings for the run rather than created per meeting, so its threads (and their
+        # database connections) are reused; shut down in fetch_all_data
+        self._endpoint_executor = ThreadPoolExecutor(max_workers=endpoint_workers, thread_name_prefix='endpoint')
+        # Session and driver keys taken from the API responses as they are stored, so the per-session loop
+        # doesn't query them back; the database is only asked on a miss (e.g. when resuming a meeting)
+        self._sessions_by_meeting: Dict[int, List[int]] = {}
+        self._drivers_by_session: Dict[int, List[int]] = {}
         
         # Initialize managers with current configuration
         self.db_manager = DatabaseManager(db_filename)
-        self.progress_manager = ProgressManager(self.years, self.meetings_filter)
+        self.progress_manager = ProgressManager(self.db_manager, self.years, self.meetings_filter)
         self.api_client = OpenF1APIClient(self.db_manager)
     
     def fetch_meetings_for_years(self) -> List[Dict]:
@@ -55,9 +67,9 @@ class OpenF1Fetcher:
         # Step 1: Store meeting data if not already done
         if not self.progress_manager.is_meeting_fetched(meeting_key):
             logger.info(f"Storing meeting {meeting_key} data...")
-            self.db_manager.insert_data("meetings", [meeting])
-            self.progress_manager.mark_meeting_fetched(meeting_key)
-            self.progress_manager.save_progress()
+            with self.db_manager.transaction():
+                self.db_manager.insert_data("meetings", [meeting])
+                self.progress_manager.mark_meeting_fetched(meeting_key)
             logger.info(f"Meeting {meeting_key} data stored")
         else:
             logger.info(f"Meeting {meeting_key} data already stored")
@@ -68,15 +80,15 @@ class OpenF1Fetcher:
             sessions = self.api_client.make_request_with_retry("sessions", {"meeting_key": meeting_key})
             
             if sessions:
-                self.db_manager.insert_data("sessions", sessions)
-                self.progress_manager.mark_sessions_fetched(meeting_key)
-                self.progress_manager.save_progress()
+                with self.db_manager.transaction():
+                    self.db_manager.insert_data("sessions", sessions)
+                    self.progress_manager.mark_sessions_fetched(meeting_key)
+                self._sessions_by_meeting[meeting_key] = [s['session_key'] for s in sessions if s.get('session_key') is not None]
                 logger.info(f"Stored {len(sessions)} sessions for meeting {meeting_key}")
             else:
                 logger.warning(f"No sessions found for meeting {meeting_key}")
                 # Mark as fetched even if no sessions to avoid retrying
                 self.progress_manager.mark_sessions_fetched(meeting_key)
-                self.progress_manager.save_progress()
         else:
             logger.info(f"Sessions for meeting {meeting_key} already fetched")
         
@@ -101,25 +113,44 @@ class OpenF1Fetcher:
             'race_control', 'stints', 'team_radio', 'weather'
         ]
         
+        # Requests overlap on a thread pool; once all have returned, results are stored in endpoint order
+        # on this thread in a single transaction
+        futures = []
         for endpoint in meeting_endpoints:
             logger.info(f"Fetching {endpoint} data for meeting {meeting_key}...")
-            
-            data = self.api_client.make_request_with_retry(endpoint, {"meeting_key": meeting_key})
-            if data:
-                self.db_manager.insert_data(endpoint, data)
-                logger.info(f"Successfully fetched {len(data)} records for {endpoint}")
-            else:
-                logger.warning(f"No data found for {endpoint} in meeting {meeting_key}")
+            futures.append((endpoint, self._endpoint_executor.submit(self.api_client.make_request_with_retry, endpoint, {"meeting_key": meeting_key})))
+        results = [(endpoint, future.result()) for endpoint, future in futures]
         
-        # Mark meeting data as fetched
-        self.progress_manager.mark_meeting_data_fetched(meeting_key)
-        self.progress_manager.save_progress()
+        with self.db_manager.transaction():
+            for endpoint, data in results:
+                if data:
+                    self.db_manager.insert_data(endpoint, data)
+                    if endpoint == 'drivers':
+                        self._remember_drivers(data)
+                    logger.info(f"Successfully fetched {len(data)} records for {endpoint}")
+                else:
+                    logger.warning(f"No data found for {endpoint} in meeting {meeting_key}")
+            
+            # Mark meeting data as fetched, committed together with the data
+            self.progress_manager.mark_meeting_data_fetched(meeting_key)
         logger.info(f"Completed fetching meeting-level data for meeting {meeting_key}")
     
+    def _remember_drivers(self, drivers: List[Dict]):
+        """Record each session's driver numbers, in first-seen order, from a drivers response."""
+        by_session: Dict[int, Dict[int, None]] = {}
+        for driver in drivers:
+            session_key, driver_number = driver.get('session_key'), driver.get('driver_number')
+            if session_key is not None and driver_number is not None:
+                by_session.setdefault(session_key, {})[driver_number] = None
+        for session_key, driver_numbers in by_session.items():
+            self._drivers_by_session[session_key] = list(driver_numbers)
+    
     def fetch_session_driver_data_for_meeting(self, meeting_key: int):
         """Fetch session-driver data for all sessions in a specific meeting."""
-        # Get all sessions for this meeting directly
-        meeting_sessions = self.db_manager.get_sessions_for_meeting(meeting_key)
+        # Get all sessions for this meeting, from the sessions response when this run fetched it
+        meeting_sessions = self._sessions_by_meeting.get(meeting_key)
+        if meeting_sessions is None:
+            meeting_sessions = self.db_manager.get_sessions_for_meeting(meeting_key)
         
         if not meeting_sessions:
             logger.warning(f"No sessions found for meeting {meeting_key}")
@@ -136,12 +167,13 @@ class OpenF1Fetcher:
                 continue
             
             # Get drivers for this specific session
-            driver_numbers = self.db_manager.get_drivers_for_session(session_key)
+            driver_numbers = self._drivers_by_session.get(session_key)
+            if driver_numbers is None:
+                driver_numbers = self.db_manager.get_drivers_for_session(session_key)
             
             if not driver_numbers:
                 logger.warning(f"No drivers found for session {session_key}, skipping...")
                 self.progress_manager.mark_session_data_fetched(session_key, meeting_key)
-                self.progress_manager.save_progress()
                 continue
             
             logger.info(f"Processing session {session_key} with {len(driver_numbers)} drivers")
@@ -149,26 +181,55 @@ class OpenF1Fetcher:
             for endpoint in session_driver_endpoints:
                 logger.info(f"Fetching {endpoint} data for session {session_key}...")
                 
-                # Use chunked request to handle large data sets
-                all_data = self.api_client.make_chunked_request(
+                # Telemetry samples never change once recorded, so when an earlier run stored part of this session
+                # the rows already stored are dropped before inserting instead of each going through the upsert's
+                # conflict handling; a session with nothing stored yet (the usual case) skips the per-driver lookup
+                resuming = self.db_manager.is_data_exists(endpoint, 'session_key', session_key)
+                
+                # Use chunked request to handle large data sets; each driver's records are stored
+                # as they arrive so only one driver's payload is held in memory at a time
+                total_records = 0
+                for driver_data in self.api_client.iter_chunked_request(
                     endpoint, 
                     {"session_key": session_key}, 
                     "driver_number", 
                     driver_numbers
-                )
+                ):
+                    total_records += len(driver_data)
+                    if resuming:
+                        existing = self.db_manager.get_existing_dates(endpoint, session_key, driver_data[0].get('driver_number'))
+                        if existing:
+                            driver_data = [record for record in driver_data if record.get('date') not in existing]
+                    self.db_manager.insert_data(endpoint, driver_data)
                 
-                if all_data:
-                    self.db_manager.insert_data(endpoint, all_data)
-                    logger.info(f"Successfully fetched {len(all_data)} records for {endpoint}")
+                if total_records:
+                    logger.info(f"Successfully fetched {total_records} records for {endpoint}")
                 else:
                     logger.warning(f"No data found for {endpoint} in session {session_key}")
             
             # Mark this session as completed
             self.progress_manager.mark_session_data_fetched(session_key, meeting_key)
-            self.progress_manager.save_progress()
             
             logger.info(f"Completed processing session {session_key}")
     
+    def _process_meeting_in_order(self, i: int, total: int, meeting: Dict):
+        """Process one meeting of the run, logging its position in the queue."""
+        meeting_key = meeting['meeting_key']
+        meeting_name = meeting.get('meeting_name', f'Meeting {meeting_key}')
+        
+        logger.info(f"=== Processing meeting {i}/{total}: {meeting_name} (Key: {meeting_key}) ===")
+        
+        # Check if this meeting is already fully completed
+        if self.progress_manager.is_meeting_completed(meeting_key):
+            logger.info(f"Meeting {meeting_key} already fully completed, skipping...")
+            return
+        
+        # Process this meeting
+        self.process_meeting(meeting)
+        
+        logger.info(f"=== Completed meeting {i}/{total}: {meeting_name} ===")
+        logger.info(self.progress_manager.get_progress_summary())
+    
     def fetch_all_data(self):
         """Main method to fetch all F1 data with meeting-by-meeting processing."""
         logger.info("Starting Enhanced F1 data fetch...")
@@ -193,23 +254,14 @@ class OpenF1Fetcher:
             
             logger.info(f"Processing {len(meetings_to_process)} meetings out of {len(all_meetings)} total")
             
-            # Process each meeting individually
-            for i, meeting in enumerate(meetings_to_process, 1):
-                meeting_key = meeting['meeting_key']
-                meeting_name = meeting.get('meeting_name', f'Meeting {meeting_key}')
-                
-                logger.info(f"=== Processing meeting {i}/{len(meetings_to_process)}: {meeting_name} (Key: {meeting_key}) ===")
-                
-                # Check if this meeting is already fully completed
-                if self.progress_manager.is_meeting_completed(meeting_key):
-                    logger.info(f"Meeting {meeting_key} already fully completed, skipping...")
-                    continue
-                
-                # Process this meeting
-                self.process_meeting(meeting)
-                
-                logger.info(f"=== Completed meeting {i}/{len(meetings_to_process)}: {meeting_name} ===")
-                logger.info(self.progress_manager.get_progress_summary())
+            # Process meetings on a bounded worker pool; the first failure is re-raised once in-flight meetings finish
+            with ThreadPoolExecutor(max_workers=self.meeting_workers) as executor:
+                futures = [
+                    executor.submit(self._process_meeting_in_order, i, len(meetings_to_process), meeting)
+                    for i, meeting in enumerate(meetings_to_process, 1)
+                ]
+                for future in futures:
+                    future.result()
             
             logger.info("All meetings processed successfully!")
             self.db_manager.print_summary()
@@ -218,3 +270,7 @@ class OpenF1Fetcher:
             logger.error(f"Error during data fetch: {e}")
             logger.info("Progress has been saved. You can resume by running the script again.")
             raise
+        finally:
+            self._endpoint_executor.shutdown(wait=True, cancel_futures=True)
+            self.api_client.close()
+            self.db_manager.close()
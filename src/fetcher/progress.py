@@ -6,135 +6,168 @@ import json
 import os
 import logging
 import hashlib
-from typing import Dict, List, Union
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Set, Union
 from .config import DATA_FOLDER, PROGRESS_FILENAME
 
 logger = logging.getLogger(__name__)
 
+MEETING_FLAGS = ('meeting_fetched', 'sessions_fetched', 'data_fetched')
+
 class ProgressManager:
-    def __init__(self, years: Union[int, List[int]], meetings_filter: Union[int, List[int], slice] = None):
-        self.progress_path = os.path.join(DATA_FOLDER, PROGRESS_FILENAME)
+    """Resumable fetch state, kept in the progress_* tables of the fetcher's database.
+    
+    Each state change is a single-row upsert, so it is durable as soon as it commits and can share a
+    transaction with the data it records; there is no file to re-encode and rewrite.
+    """
+    
+    def __init__(self, db_manager, years: Union[int, List[int]], meetings_filter: Union[int, List[int], slice] = None):
+        self.db_manager = db_manager
+        self.progress_path = os.path.join(DATA_FOLDER, PROGRESS_FILENAME)  # Legacy JSON progress, imported once
         self.years = years if isinstance(years, list) else [years]
         self.meetings_filter = meetings_filter
         
+        # Completed keys per flag, mirrored in memory so the per-meeting and per-session checks skip the database
+        self._completed_meetings: Dict[str, Set[int]] = {flag: set() for flag in MEETING_FLAGS}
+        self._completed_sessions: Set[int] = set()
+        self._fully_completed: Set[int] = set()  # Meetings with every flag set, maintained as flags are marked
+        # Meetings are processed on a thread pool, so the in-memory sets are updated and summarized under a lock
+        self._lock = threading.Lock()
+        
         # Create a hash of the current configuration to detect changes
         self.config_hash = self._create_config_hash()
-        self.progress = self.load_progress()
+        self.load_progress()
+        self._load_completed()
     
     def _create_config_hash(self) -> str:
         """Create a hash of the current configuration to detect parameter changes."""
         config_str = f"years:{sorted(self.years)},meetings_filter:{self.meetings_filter}"
-        return hashlib.md5(config_str.encode()).hexdigest()
-    
-    def load_progress(self) -> Dict:
-        """Load fetch progress from file."""
-        default_progress = {
-            'config_hash': self.config_hash,
-            'years': self.years,
-            'meetings_filter': self.meetings_filter,
-            'completed_meetings': {},  # {meeting_key: {'meeting_fetched': bool, 'sessions_fetched': bool, 'data_fetched': bool}}
-            'completed_sessions': {},  # {session_key: {'meeting_key': int, 'data_fetched': bool}}
-            'current_meeting_index': 0,
-            'total_meetings_found': 0
-        }
+        # An identity check, not a security one; md5 is kept so hashes stored by earlier runs still match
+        return hashlib.md5(config_str.encode(), usedforsecurity=False).hexdigest()
+    
+    def load_progress(self):
+        """Check stored progress against the current configuration, resetting it if the configuration changed."""
+        saved_hash = self.get('config_hash')
         
-        if os.path.exists(self.progress_path):
-            try:
-                with open(self.progress_path, 'r') as f:
-                    saved_progress = json.load(f)
-                    
-                    # Check if configuration has changed
-                    if saved_progress.get('config_hash') != self.config_hash:
-                        logger.info("Configuration changed, resetting progress")
-                        logger.info(f"Old config: years={saved_progress.get('years')}, meetings_filter={saved_progress.get('meetings_filter')}")
-                        logger.info(f"New config: years={self.years}, meetings_filter={self.meetings_filter}")
-                        return default_progress
-                    
-                    # Merge with defaults for any missing keys
-                    for key, value in default_progress.items():
-                        if key not in saved_progress:
-                            saved_progress[key] = value
-                    
-                    logger.info(f"Loaded progress: {len(saved_progress.get('completed_meetings', {}))} meetings processed")
-                    return saved_progress
-                    
-            except Exception as e:
-                logger.warning(f"Could not load progress file: {e}")
+        if saved_hash is None:
+            self._import_json_progress()
+        elif saved_hash != self.config_hash:
+            logger.info("Configuration changed, resetting progress")
+            logger.info(f"Old config: years={self.get('years')}, meetings_filter={self.get('meetings_filter')}")
+            logger.info(f"New config: years={self.years}, meetings_filter={self.meetings_filter}")
+            with self.db_manager.transaction():
+                self.db_manager.execute_write("DELETE FROM progress_meetings")
+                self.db_manager.execute_write("DELETE FROM progress_sessions")
+                self.db_manager.execute_write("DELETE FROM progress_meta")
+        else:
+            logger.info(f"Loaded progress: {self._count('progress_meetings')} meetings processed")
+            return
         
-        logger.info("Starting with fresh progress")
-        return default_progress
+        with self.db_manager.transaction():
+            self.set('config_hash', self.config_hash)
+            self.set('years', self.years)
+            self.set('meetings_filter', str(self.meetings_filter) if isinstance(self.meetings_filter, slice) else self.meetings_filter)
     
-    def save_progress(self):
-        """Save current progress to file."""
+    def _import_json_progress(self):
+        """Carry over a progress file written by earlier versions, if it matches the current configuration."""
         try:
-            with open(self.progress_path, 'w') as f:
-                json.dump(self.progress, f, indent=2)
+            saved_progress = json.loads(Path(self.progress_path).read_bytes())
+        except FileNotFoundError:
+            logger.info("Starting with fresh progress")
+            return
         except Exception as e:
-            logger.error(f"Could not save progress: {e}")
+            logger.warning(f"Could not load progress file: {e}")
+            return
+        
+        if saved_progress.get('config_hash') != self.config_hash:
+            logger.info("Progress file is for a different configuration, starting with fresh progress")
+            return
+        
+        with self.db_manager.transaction():
+            for meeting_key, flags in saved_progress.get('completed_meetings', {}).items():
+                for flag in MEETING_FLAGS:
+                    if flags.get(flag):
+                        self._mark_meeting(int(meeting_key), flag)
+            for session_key, session in saved_progress.get('completed_sessions', {}).items():
+                if session.get('data_fetched'):
+                    self.mark_session_data_fetched(int(session_key), session.get('meeting_key'))
+        logger.info(f"Imported progress from {self.progress_path}: {len(saved_progress.get('completed_meetings', {}))} meetings processed")
+    
+    def _load_completed(self):
+        """Fill the in-memory completed sets from the progress tables."""
+        for flag in MEETING_FLAGS:
+            self._completed_meetings[flag] = {
+                row[0] for row in self.db_manager.query(f"SELECT meeting_key FROM progress_meetings WHERE {flag}")
+            }
+        self._completed_sessions = {
+            row[0] for row in self.db_manager.query("SELECT session_key FROM progress_sessions WHERE data_fetched")
+        }
+        self._fully_completed = set.intersection(*self._completed_meetings.values())
+    
+    def _count(self, table: str) -> int:
+        return self.db_manager.query(f"SELECT COUNT(*) FROM {table}")[0][0]
     
     def get(self, key: str, default=None):
         """Get progress value."""
-        return self.progress.get(key, default)
+        rows = self.db_manager.query("SELECT value FROM progress_meta WHERE key = ?", (key,))
+        return json.loads(rows[0][0]) if rows else default
     
-    def set(self, key: str, value):
+    def set(self, key: str, value: Any):
         """Set progress value."""
-        self.progress[key] = value
+        self.db_manager.execute_write("INSERT OR REPLACE INTO progress_meta (key, value) VALUES (?, ?)",
+                                      (key, json.dumps(value)))
+    
+    def _meeting_flag(self, meeting_key: int, flag: str) -> bool:
+        return meeting_key in self._completed_meetings[flag]
+    
+    def _mark_meeting(self, meeting_key: int, flag: str):
+        self.db_manager.execute_write(f"INSERT INTO progress_meetings (meeting_key, {flag}) VALUES (?, 1) "
+                                      f"ON CONFLICT (meeting_key) DO UPDATE SET {flag} = 1", (meeting_key,))
+        with self._lock:
+            self._completed_meetings[flag].add(meeting_key)
+            if all(meeting_key in keys for keys in self._completed_meetings.values()):
+                self._fully_completed.add(meeting_key)
     
     def is_meeting_completed(self, meeting_key: int) -> bool:
         """Check if a meeting is fully completed (meeting + sessions + data)."""
-        meeting_progress = self.progress['completed_meetings'].get(str(meeting_key), {})
-        return (meeting_progress.get('meeting_fetched', False) and 
-                meeting_progress.get('sessions_fetched', False) and 
-                meeting_progress.get('data_fetched', False))
+        return meeting_key in self._fully_completed
     
     def is_meeting_fetched(self, meeting_key: int) -> bool:
         """Check if meeting data is fetched."""
-        meeting_progress = self.progress['completed_meetings'].get(str(meeting_key), {})
-        return meeting_progress.get('meeting_fetched', False)
+        return self._meeting_flag(meeting_key, 'meeting_fetched')
     
     def is_sessions_fetched(self, meeting_key: int) -> bool:
         """Check if sessions for meeting are fetched."""
-        meeting_progress = self.progress['completed_meetings'].get(str(meeting_key), {})
-        return meeting_progress.get('sessions_fetched', False)
+        return self._meeting_flag(meeting_key, 'sessions_fetched')
     
     def is_meeting_data_fetched(self, meeting_key: int) -> bool:
         """Check if meeting data (intervals, laps, etc.) is fetched."""
-        meeting_progress = self.progress['completed_meetings'].get(str(meeting_key), {})
-        return meeting_progress.get('data_fetched', False)
+        return self._meeting_flag(meeting_key, 'data_fetched')
     
     def mark_meeting_fetched(self, meeting_key: int):
         """Mark meeting as fetched."""
-        meeting_key_str = str(meeting_key)
-        if meeting_key_str not in self.progress['completed_meetings']:
-            self.progress['completed_meetings'][meeting_key_str] = {}
-        self.progress['completed_meetings'][meeting_key_str]['meeting_fetched'] = True
+        self._mark_meeting(meeting_key, 'meeting_fetched')
     
     def mark_sessions_fetched(self, meeting_key: int):
         """Mark sessions for meeting as fetched."""
-        meeting_key_str = str(meeting_key)
-        if meeting_key_str not in self.progress['completed_meetings']:
-            self.progress['completed_meetings'][meeting_key_str] = {}
-        self.progress['completed_meetings'][meeting_key_str]['sessions_fetched'] = True
+        self._mark_meeting(meeting_key, 'sessions_fetched')
     
     def mark_meeting_data_fetched(self, meeting_key: int):
         """Mark meeting data as fetched."""
-        meeting_key_str = str(meeting_key)
-        if meeting_key_str not in self.progress['completed_meetings']:
-            self.progress['completed_meetings'][meeting_key_str] = {}
-        self.progress['completed_meetings'][meeting_key_str]['data_fetched'] = True
+        self._mark_meeting(meeting_key, 'data_fetched')
     
     def is_session_data_fetched(self, session_key: int) -> bool:
         """Check if session-specific data (car_data, location) is fetched."""
-        session_progress = self.progress['completed_sessions'].get(str(session_key), {})
-        return session_progress.get('data_fetched', False)
+        return session_key in self._completed_sessions
     
     def mark_session_data_fetched(self, session_key: int, meeting_key: int):
         """Mark session data as fetched."""
-        session_key_str = str(session_key)
-        self.progress['completed_sessions'][session_key_str] = {
-            'meeting_key': meeting_key,
-            'data_fetched': True
-        }
+        self.db_manager.execute_write(
+            "INSERT OR REPLACE INTO progress_sessions (session_key, meeting_key, data_fetched) VALUES (?, ?, 1)",
+            (session_key, meeting_key))
+        with self._lock:
+            self._completed_sessions.add(session_key)
     
     def get_meetings_to_process(self, all_meetings: List[Dict]) -> List[Dict]:
         """Get list of meetings that need processing based on current filter."""
@@ -164,8 +197,8 @@ class ProgressManager:
     
     def get_progress_summary(self) -> str:
         """Get a summary of current progress."""
-        completed_meetings = len([m for m in self.progress['completed_meetings'].values() 
-                                if m.get('meeting_fetched', False) and m.get('sessions_fetched', False) and m.get('data_fetched', False)])
-        total_sessions = len(self.progress['completed_sessions'])
+        with self._lock:
+            completed_meetings = len(self._fully_completed)
+            total_sessions = len(self._completed_sessions)
         
         return f"Progress: {completed_meetings} meetings fully completed, {total_sessions} sessions processed"
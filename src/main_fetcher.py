@@ -5,21 +5,40 @@ Fetches F1 data from OpenF1 API with flexible year/meeting selection and robust
 """
 
 import os
+import atexit
+import queue
 import logging
+import logging.handlers
 from fetcher.fetcher import OpenF1Fetcher
 from fetcher.config import DATA_FOLDER, LOG_FILENAME
 
 def setup_logging():
-    """Setup logging configuration."""
+    """Setup logging configuration.
+    
+    Fetch threads only enqueue records; a background listener formats them and does the file and
+    console I/O, so handler locks and disk writes stay off the request path.
+    """
     log_path = os.path.join(DATA_FOLDER, LOG_FILENAME)
     
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    handlers = [
+        logging.FileHandler(log_path),
+        logging.StreamHandler()
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers)
+    listener.start()
+    atexit.register(listener.stop)  # Flushes queued records on exit
+    
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))  # Full formatting happens in the listener
+    
     logging.basicConfig(
         level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_path),
-            logging.StreamHandler()
-        ]
+        handlers=[queue_handler]
     )
     
     logger = logging.getLogger(__name__)
@@ -3,11 +3,18 @@
 import sqlite3
 import json
 import os
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 def load_schema(schema_file_path):
     try:
-        with open(schema_file_path, 'r') as f:
-            schema = json.load(f)
+        # One read of the whole file, decoded from bytes; orjson.JSONDecodeError subclasses json.JSONDecodeError
+        data = Path(schema_file_path).read_bytes()
+        schema = orjson.loads(data) if orjson is not None else json.loads(data)
         return schema
     except FileNotFoundError:
         print(f"Error: Schema file not found at {schema_file_path}")
@@ -21,7 +28,7 @@ def create_tables_in_new_db(new_db_conn, schema):
         print("Error: Schema not loaded. Cannot create tables.")
         return
 
-    cursor = new_db_conn.cursor()
+    statements = []
     for table_name, columns_def in schema.items():
         if table_name == "sqlite_sequence":
             continue
@@ -45,13 +52,23 @@ def create_tables_in_new_db(new_db_conn, schema):
         create_table_sql = f'CREATE TABLE IF NOT EXISTS "{table_name}" ('
         create_table_sql += ", ".join(column_definitions)
         create_table_sql += ");"
+        statements.append((table_name, create_table_sql))
 
-        try:
-            cursor.execute(create_table_sql)
-        except sqlite3.Error as e:
-            print(f"Error creating table {table_name}: {e}")
-            print(f"Problematic SQL: {create_table_sql}")
-    new_db_conn.commit()
+    # All tables are created by one script in one transaction; only if that fails are the statements
+    # rerun one by one, so each broken table is reported and the rest are still created
+    try:
+        new_db_conn.executescript("BEGIN;\n" + "\n".join(sql for _, sql in statements) + "\nCOMMIT;")
+    except sqlite3.Error:
+        if new_db_conn.in_transaction:
+            new_db_conn.execute("ROLLBACK")
+        cursor = new_db_conn.cursor()
+        for table_name, create_table_sql in statements:
+            try:
+                cursor.execute(create_table_sql)
+            except sqlite3.Error as e:
+                print(f"Error creating table {table_name}: {e}")
+                print(f"Problematic SQL: {create_table_sql}")
+        new_db_conn.commit()
     print("Tables created successfully in the new database.")
 
 def extract_and_insert_data(source_db_conn, new_db_conn, schema, meeting_id):
@@ -59,45 +76,59 @@ def extract_and_insert_data(source_db_conn, new_db_conn, schema, meeting_id):
         print("Error: Schema not loaded. Cannot extract data.")
         return
 
-    source_cursor = source_db_conn.cursor()
+    # Rows are copied by SQLite itself with INSERT ... SELECT from the attached source file, so they never
+    # pass through Python; the source connection only tells us which file to attach
+    source_db_path = next(row[2] for row in source_db_conn.execute("PRAGMA database_list") if row[1] == "main")
     new_cursor = new_db_conn.cursor()
+    new_cursor.execute("ATTACH DATABASE ? AS src", (source_db_path,))
 
-    for table_name, columns_def in schema.items():
-        if table_name in {"sqlite_sequence", "fetch_progress"}:
-            print(f"Skipping table {table_name}")
-            continue
+    # The new database is built from scratch and discarded on failure, so durability can be traded for speed:
+    # no syncs, rollback journal kept in memory, and a large page cache for the bulk load
+    new_cursor.execute("PRAGMA main.synchronous=OFF")
+    new_cursor.execute("PRAGMA main.journal_mode=MEMORY")
+    new_cursor.execute("PRAGMA temp_store=MEMORY")
+    new_cursor.execute("PRAGMA main.cache_size=-200000")
 
-        has_meeting_key_column = any(col['name'] == 'meeting_key' for col in columns_def)
-        columns = [f'"{col["name"]}"' for col in columns_def]
-        col_names_str = ", ".join(columns)
-        placeholders = ", ".join(["?"] * len(columns))
-
-        if has_meeting_key_column:
-            select_sql = f'SELECT {col_names_str} FROM "{table_name}" WHERE "meeting_key" = ?;'
-            source_cursor.execute(select_sql, (meeting_id,))
-        elif any(col['name'] == 'session_key' for col in columns_def):
-            source_cursor.execute('SELECT "session_key" FROM "sessions" WHERE "meeting_key" = ?', (meeting_id,))
-            session_keys = [row[0] for row in source_cursor.fetchall()]
-            if not session_keys:
-                print(f"No sessions found for meeting {meeting_id}. Skipping table {table_name}.")
+    # One explicit transaction for the whole copy
+    new_cursor.execute("BEGIN IMMEDIATE")
+    try:
+        for table_name, columns_def in schema.items():
+            if table_name in {"sqlite_sequence", "fetch_progress", "progress_meta", "progress_meetings", "progress_sessions"}:
+                print(f"Skipping table {table_name}")
                 continue
-            session_key_placeholders = ", ".join(["?"] * len(session_keys))
-            select_sql = f'SELECT {col_names_str} FROM "{table_name}" WHERE "session_key" IN ({session_key_placeholders});'
-            source_cursor.execute(select_sql, session_keys)
-        else:
-            print(f"Skipping table {table_name} — no 'meeting_key' or 'session_key'")
-            continue
 
-        rows = source_cursor.fetchall()
-        if rows:
-            insert_sql = f'INSERT INTO "{table_name}" ({col_names_str}) VALUES ({placeholders});'
+            column_names = frozenset(col['name'] for col in columns_def)
+            columns = [f'"{col["name"]}"' for col in columns_def]
+            col_names_str = ", ".join(columns)
+
+            if 'meeting_key' in column_names:
+                where_sql = '"meeting_key" = ?'
+            elif 'session_key' in column_names:
+                new_cursor.execute('SELECT 1 FROM src."sessions" WHERE "meeting_key" = ? LIMIT 1', (meeting_id,))
+                if new_cursor.fetchone() is None:
+                    print(f"No sessions found for meeting {meeting_id}. Skipping table {table_name}.")
+                    continue
+                where_sql = '"session_key" IN (SELECT "session_key" FROM src."sessions" WHERE "meeting_key" = ?)'
+            else:
+                print(f"Skipping table {table_name} — no 'meeting_key' or 'session_key'")
+                continue
+
+            insert_sql = (f'INSERT INTO main."{table_name}" ({col_names_str}) '
+                          f'SELECT {col_names_str} FROM src."{table_name}" WHERE {where_sql};')
             try:
-                new_cursor.executemany(insert_sql, rows)
-                print(f"Inserted {len(rows)} rows into {table_name} for meeting {meeting_id}.")
+                new_cursor.execute(insert_sql, (meeting_id,))
             except sqlite3.Error as e:
                 print(f"Error inserting into {table_name}: {e}")
-
-    new_db_conn.commit()
+            else:
+                if new_cursor.rowcount > 0:
+                    print(f"Inserted {new_cursor.rowcount} rows into {table_name} for meeting {meeting_id}.")
+    except BaseException:
+        new_cursor.execute("ROLLBACK")
+        raise
+    else:
+        new_cursor.execute("COMMIT")
+    finally:
+        new_cursor.execute("DETACH DATABASE src")
     print("Data extraction and insertion complete.")
 
 def main():
@@ -146,7 +177,7 @@ def main():
             return
 
     try:
-        new_conn = sqlite3.connect(new_db_path)
+        new_conn = sqlite3.connect(new_db_path, isolation_level=None)  # Transactions are managed explicitly
         print("Connected to new DB.")
     except sqlite3.Error as e:
         print(f"Connection error (new DB): {e}")
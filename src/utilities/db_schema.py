@@ -10,21 +10,29 @@ import os
 import sys
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Lock
+from threading import Lock, local
 from tqdm import tqdm
 import time
 from typing import Dict, List, Tuple, Any
 
 
 class DatabaseSchemaAnalyzer:
-    def __init__(self, max_workers: int = 8):
+    def __init__(self, max_workers: int = 8, approximate_counts: bool = False, analyze: bool = False):
         # Set database name as a variable inside the code
         self.db_name = "f1db_YR=2024"
         self.max_workers = max_workers
+        # Take row counts from sqlite_stat1 (left by the last ANALYZE) instead of scanning each table
+        self.approximate_counts = approximate_counts
+        # Run ANALYZE first when sqlite_stat1 is missing, so approximate counts have statistics to read
+        self.analyze = analyze
+        self.estimated_tables: List[str] = []
         self.db_path = Path(f"data/{self.db_name}/database.db")
         self.output_path = Path(f"data/{self.db_name}/schema.json")
         self.lock = Lock()
         self.schema = {}
+        # One read-only connection per worker thread, opened on first use and closed after the batch
+        self._tls = local()
+        self._connections: List[sqlite3.Connection] = []
         
     def validate_database(self) -> bool:
         """Check if database file exists and is accessible."""
@@ -33,8 +41,11 @@ class DatabaseSchemaAnalyzer:
             return False
             
         try:
-            with sqlite3.connect(str(self.db_path)) as conn:
+            conn = self._connect_read_only()
+            try:
                 conn.execute("SELECT 1")
+            finally:
+                conn.close()
             return True
         except sqlite3.Error as e:
             print(f"❌ Database error: {e}")
@@ -42,44 +53,151 @@ class DatabaseSchemaAnalyzer:
     
     def get_table_names(self) -> List[str]:
         """Get all table names from the database."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        conn = self._connect_read_only()
+        try:
             cursor = conn.execute("""
                 SELECT name FROM sqlite_master 
                 WHERE type='table' AND name NOT LIKE 'sqlite_%'
                 ORDER BY name
             """)
             return [row[0] for row in cursor.fetchall()]
+        finally:
+            conn.close()
+    
+    def _connect_read_only(self) -> sqlite3.Connection:
+        """Open the database through a read-only, query_only URI with memory-mapped I/O and a large page cache.
+        
+        Not opened as immutable: the fetcher may still be writing to the file while it is analyzed.
+        """
+        conn = sqlite3.connect(f"{self.db_path.resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only=1")  # Refuse writes at the statement level too, not just at the file
+        conn.execute("PRAGMA mmap_size=268435456")  # 256 MiB; COUNT(*) scans read pages straight from the mapping
+        conn.execute("PRAGMA cache_size=-200000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+    
+    def _get_connection(self) -> sqlite3.Connection:
+        """Get this thread's connection, opening it read-only with memory-mapped I/O on first use."""
+        conn = getattr(self._tls, "conn", None)
+        if conn is None:
+            conn = self._connect_read_only()
+            self._tls.conn = conn
+            with self.lock:
+                self._connections.append(conn)
+        return conn
     
-    def analyze_table(self, table_name: str) -> Dict[str, Any]:
-        """Analyze a single table structure and row count."""
-        with sqlite3.connect(str(self.db_path)) as conn:
-            # Get column information (excluding not_null and primary_key)
-            cursor = conn.execute(f"PRAGMA table_info({table_name})")
+    def _close_connections(self):
+        """Close every worker connection opened by _get_connection."""
+        with self.lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._tls = local()
+    
+    def get_all_columns(self) -> Dict[str, List[Dict[str, str]]]:
+        """Get column information (excluding not_null and primary_key) for every table in one query."""
+        conn = self._connect_read_only()
+        try:
+            cursor = conn.execute("""
+                SELECT m.name, ti.name, ti.type
+                FROM sqlite_master AS m, pragma_table_info(m.name) AS ti
+                WHERE m.type='table' AND m.name NOT LIKE 'sqlite_%'
+                ORDER BY m.name, ti.cid
+            """)
+            all_columns: Dict[str, List[Dict[str, str]]] = {}
+            for table_name, column_name, column_type in cursor:
+                all_columns.setdefault(table_name, []).append({
+                    "name": column_name,
+                    "type": column_type if column_type else "NULL"
+                })
+            return all_columns
+        finally:
+            conn.close()
+    
+    def analyze_table(self, table_name: str, columns: List[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Analyze a single table structure and row count.
+        
+        Columns already read by get_all_columns can be passed in to skip the per-table PRAGMA.
+        """
+        conn = self._get_connection()
+        
+        # Get column information (excluding not_null and primary_key)
+        if columns is None:
+            cursor = conn.execute("SELECT name, type FROM pragma_table_info(?) ORDER BY cid", (table_name,))
             columns = []
-            for row in cursor.fetchall():
+            for name, column_type in cursor.fetchall():
                 columns.append({
-                    "name": row[1],
-                    "type": row[2] if row[2] else "NULL"
+                    "name": name,
+                    "type": column_type if column_type else "NULL"
                 })
-            
-            # Get row count
-            cursor = conn.execute(f"SELECT COUNT(*) FROM {table_name}")
+        
+        # Get row count
+        row_count = self._estimate_row_count(conn, table_name) if self.approximate_counts else None
+        if row_count is not None:
+            with self.lock:
+                self.estimated_tables.append(table_name)
+        else:
+            quoted_name = table_name.replace('"', '""')
+            cursor = conn.execute(f'SELECT COUNT(*) FROM "{quoted_name}"')
             row_count = cursor.fetchone()[0]
-            
-            return {
-                "name": table_name,
-                "row_count": row_count,
-                "columns": columns
-            }
+        
+        return {
+            "name": table_name,
+            "row_count": row_count,
+            "columns": columns
+        }
+    
+    def _estimate_row_count(self, conn: sqlite3.Connection, table_name: str):
+        """Row count recorded by the last ANALYZE, or None if the table has no statistics.
+        
+        The first field of every sqlite_stat1 entry is the table's row count at ANALYZE time. ANALYZE itself
+        isn't run here since it writes to the database; max(rowid) isn't used either, as INSERT OR REPLACE
+        leaves gaps in the fetcher's rowids.
+        """
+        try:
+            rows = conn.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ?", (table_name,)).fetchall()
+        except sqlite3.OperationalError:  # No ANALYZE has ever run
+            return None
+        counts = [int(stat.split()[0]) for (stat,) in rows if stat]
+        return max(counts) if counts else None
+    
+    def _has_statistics(self) -> bool:
+        """Whether ANALYZE has left a sqlite_stat1 table in the database."""
+        conn = self._connect_read_only()
+        try:
+            return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone() is not None
+        finally:
+            conn.close()
+    
+    def run_analyze(self) -> bool:
+        """Gather sqlite_stat1 statistics with ANALYZE on a writable connection.
+        
+        A full ANALYZE rather than a sampled one: with analysis_limit the row counts of indexed tables
+        are extrapolated and can be well off. It costs about one pass over each table's indexes, once.
+        """
+        print("📐 No sqlite_stat1 statistics found, running ANALYZE...")
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                conn.execute("ANALYZE")
+                conn.commit()
+            finally:
+                conn.close()
+            return True
+        except sqlite3.Error as e:
+            print(f"⚠️  ANALYZE failed, counting rows exactly: {e}")
+            return False
     
     def process_tables_batch(self, table_names: List[str]) -> List[Dict[str, Any]]:
         """Process a batch of tables in parallel."""
         results = []
+        # Column lists for all tables come from a single query; workers only run the row counts
+        all_columns = self.get_all_columns()
         
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
             # Submit all table analysis tasks
             future_to_table = {
-                executor.submit(self.analyze_table, table): table 
+                executor.submit(self.analyze_table, table, all_columns.get(table)): table 
                 for table in table_names
             }
             
@@ -98,6 +216,7 @@ class DatabaseSchemaAnalyzer:
                         print(f"\n⚠️  Error analyzing table '{table_name}': {e}")
                         pbar.update(1)
         
+        self._close_connections()
         return results
     
     def generate_schema(self) -> Dict[str, Any]:
@@ -113,6 +232,11 @@ class DatabaseSchemaAnalyzer:
             return {"tables": [], "metadata": {"total_tables": 0}}
         
         print(f"📊 Found {total_tables} tables")
+        if self.approximate_counts:
+            print("📐 Row counts are taken from sqlite_stat1 where available (approximate)")
+            if not self._has_statistics() and not (self.analyze and self.run_analyze()):
+                print("⚠️  The database has no sqlite_stat1 statistics, so every table will be counted exactly; "
+                      "pass --analyze to run ANALYZE first")
         
         # Process tables in parallel
         start_time = time.time()
@@ -125,6 +249,7 @@ class DatabaseSchemaAnalyzer:
         # Calculate totals
         total_rows = sum(table["row_count"] for table in table_results)
         total_columns = sum(len(table["columns"]) for table in table_results)
+        estimated_tables = sorted(self.estimated_tables)
         
         schema = {
             "database_name": self.db_name,
@@ -137,9 +262,15 @@ class DatabaseSchemaAnalyzer:
                 "generated_at": time.strftime("%Y-%m-%d %H:%M:%S")
             }
         }
+        if self.approximate_counts:
+            schema["metadata"]["estimated_row_count_tables"] = estimated_tables
         
         print(f"✅ Analysis complete in {schema['metadata']['analysis_time_seconds']}s")
         print(f"📈 Summary: {total_tables} tables, {total_rows:,} rows, {total_columns} columns")
+        if self.approximate_counts:
+            exact_tables = total_tables - len(estimated_tables)
+            print(f"📐 Estimated row counts for {len(estimated_tables)} tables: {', '.join(estimated_tables) or 'none'}"
+                  f" ({exact_tables} counted exactly)")
         
         return schema
     
@@ -149,8 +280,9 @@ class DatabaseSchemaAnalyzer:
             # Ensure output directory exists
             self.output_path.parent.mkdir(parents=True, exist_ok=True)
             
+            # Encoded in one piece and written once; json.dump would stream many small chunks through the file
             with open(self.output_path, 'w', encoding='utf-8') as f:
-                json.dump(schema, f, indent=2, ensure_ascii=False)
+                f.write(json.dumps(schema, indent=2, ensure_ascii=False))
             
             print(f"💾 Schema saved to: {self.output_path}")
             print(f"📄 File size: {self.output_path.stat().st_size:,} bytes")
@@ -190,8 +322,11 @@ class DatabaseSchemaAnalyzer:
 
 def main():
     """Main entry point."""
-    # Create and run analyzer (no command line arguments needed)
-    analyzer = DatabaseSchemaAnalyzer(max_workers=8)
+    # No arguments needed; --approximate-counts takes row counts from sqlite_stat1 instead of COUNT(*) scans,
+    # and --analyze runs ANALYZE first when the database has no statistics yet
+    approximate_counts = "--approximate-counts" in sys.argv[1:]
+    analyze = "--analyze" in sys.argv[1:]
+    analyzer = DatabaseSchemaAnalyzer(max_workers=8, approximate_counts=approximate_counts, analyze=analyze)
     success = analyzer.run()
     
     sys.exit(0 if success else 1)